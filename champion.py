@@ -0,0 +1,164 @@
+"""Export the best genome from a checkpoint and drive it without NEAT.
+
+    python champion.py export neat-checkpoint-70 -o champion.json
+    python champion.py drive champion.json --map track.png
+    python champion.py drive champion.json --map track2.png --headless --laps 5
+
+The exported file holds only the champion's topology, weights and
+activations, so driving never unpickles a population. --headless runs the
+batched simulation with no window and no frame limiter, for lap-time
+benchmarks.
+"""
+import argparse
+import json
+import os
+import time
+
+# --- PYTHON 3.11+ COMPATIBILITY FIX ---
+import inspect
+if not hasattr(inspect, 'getargspec'):
+    inspect.getargspec = inspect.getfullargspec
+# --------------------------------------
+
+import numpy as np
+from neat.activations import ActivationFunctionSet
+from neat.aggregations import AggregationFunctionSet
+
+import ui_layout
+from genome_compiler import compile_network
+
+FORMAT_VERSION = 1
+
+# --- EXPORT ---
+def best_genome(population):
+    """The fittest evaluated genome of a restored neat.Population."""
+    candidates = [g for g in population.population.values() if g.fitness is not None]
+    if population.best_genome is not None:
+        candidates.append(population.best_genome)
+    if not candidates:
+        raise ValueError("Checkpoint has no evaluated genomes")
+    return max(candidates, key=lambda g: g.fitness)
+
+def export_champion(checkpoint_path, out_path):
+    import neat
+    population = neat.Checkpointer.restore_checkpoint(checkpoint_path)
+    genome = best_genome(population)
+    genome_config = population.config.genome_config
+    data = {
+        "format": FORMAT_VERSION,
+        "checkpoint": os.path.basename(checkpoint_path),
+        "generation": population.generation,
+        "genome_key": genome.key,
+        "fitness": genome.fitness,
+        "input_keys": list(genome_config.input_keys),
+        "output_keys": list(genome_config.output_keys),
+        "nodes": [{"key": k, "bias": n.bias, "response": n.response,
+                   "activation": n.activation, "aggregation": n.aggregation}
+                  for k, n in sorted(genome.nodes.items())],
+        "connections": [{"in": c.key[0], "out": c.key[1], "weight": c.weight, "enabled": c.enabled}
+                        for c in genome.connections.values()],
+    }
+    with open(out_path, "w") as f:
+        json.dump(data, f, indent=1)
+    return genome
+
+# --- LOAD ---
+class _Gene:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+class Champion:
+    """Just enough of a genome for genome_compiler and the network panel."""
+
+    def __init__(self, data):
+        if data.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported champion format: {data.get('format')!r}")
+        self.key = data["genome_key"]
+        self.fitness = data["fitness"]
+        self.input_keys = data["input_keys"]
+        self.output_keys = data["output_keys"]
+        self.nodes = {n["key"]: _Gene(**n) for n in data["nodes"]}
+        self.connections = {}
+        for c in data["connections"]:
+            key = (c["in"], c["out"])
+            self.connections[key] = _Gene(key=key, weight=c["weight"], enabled=c["enabled"])
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def compile(self):
+        return compile_network(self, self.input_keys, self.output_keys,
+                               ActivationFunctionSet(), AggregationFunctionSet())
+
+class CompiledRows:
+    """Adapts one compiled network to the row-batch interface BatchSimulation expects."""
+
+    def __init__(self, activate, num_inputs, num_outputs):
+        self.activate_one = activate
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+
+    def activate(self, inputs, rows=None):
+        return np.array([self.activate_one(list(row)) for row in inputs])
+
+# --- DRIVE ---
+def drive_headless(champion, map_file, view, zoom, laps, max_frames):
+    import simulation
+    track = simulation.Track.fit_to_view(map_file, ui_layout.game_view_width(view[0]), view[1], zoom)
+    network = CompiledRows(champion.compile(), len(champion.input_keys), len(champion.output_keys))
+    sim = simulation.BatchSimulation(simulation.TrackStack([track]), [0], network, zoom)
+
+    lap_times = []
+    start = time.perf_counter()
+    while sim.frame < max_frames and sim.alive[0] and len(lap_times) < laps:
+        sim.step()
+        if sim.laps[0] > len(lap_times):
+            lap_times.append(sim.last_lap[0])
+            print(f"Lap {len(lap_times)}: {ui_layout.format_time(lap_times[-1])}")
+    elapsed = time.perf_counter() - start
+
+    status = "crashed" if not sim.alive[0] else "running"
+    print(f"{map_file}: {len(lap_times)} laps in {sim.frame} frames ({status}), "
+          f"{sim.frame / max(elapsed, 1e-9):.0f} frames/s")
+    if lap_times:
+        print(f"Best lap: {ui_layout.format_time(min(lap_times))}")
+    return lap_times
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and drive NEAT champions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Extract the best genome of a checkpoint")
+    export.add_argument("checkpoint")
+    export.add_argument("-o", "--output", default="champion.json")
+
+    drive = sub.add_parser("drive", help="Drive an exported champion")
+    drive.add_argument("champion")
+    drive.add_argument("--map", default="track2.png")
+    drive.add_argument("--headless", action="store_true", help="No window, simulate as fast as possible")
+    drive.add_argument("--laps", type=int, default=3, help="Headless: stop after this many laps")
+    drive.add_argument("--frames", type=int, default=36000, help="Headless: frame budget")
+    drive.add_argument("--view", default="1920x1080",
+                       help="Headless: screen size the track is scaled for, as in the windowed game")
+    drive.add_argument("--zoom", type=float, default=2.5)
+    drive.add_argument("--record", metavar="PATH", help="Windowed: record to a video file or PNG directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        genome = export_champion(args.checkpoint, args.output)
+        print(f"Exported genome {genome.key} (fitness {genome.fitness:.1f}) to {args.output}")
+        return
+
+    champion = Champion.load(args.champion)
+    if args.headless:
+        view = tuple(int(v) for v in args.view.lower().split("x"))
+        drive_headless(champion, args.map, view, args.zoom, args.laps, args.frames)
+    else:
+        import main as game
+        if args.record: game.start_recording(args.record)
+        game.drive_champion(champion, champion.compile(), args.map)
+
+if __name__ == "__main__":
+    main()
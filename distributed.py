@@ -0,0 +1,393 @@
+"""Spread each generation's evaluation over worker processes on other hosts.
+
+The coordinator (inside main.py, see --distributed) cuts the generation into
+genome batches and hands them to workers over TCP. Each worker scores its
+batch headless with simulation.evaluate_on_tracks on its own copy of the
+maps and sends the fitness back. A batch whose worker disconnects, runs
+past the timeout or reports an error is put back in the queue for another
+worker; after MAX_ATTEMPTS tries the generation fails with the last error.
+
+Every genome's fitness in the batched simulation is independent of the
+other genomes in its batch, so the results match a serial evaluation.
+
+    python distributed.py worker coordinator-host:5007
+    python distributed.py verify --workers 3
+
+Messages are pickled, so every message is signed with HMAC-SHA256 and
+checked before it is unpickled. The key is derived from a shared secret
+(the F1_DISTRIBUTED_SECRET environment variable) and a random nonce the
+coordinator sends each new connection, and a worker must prove it holds the
+key before it is handed any work. Without a secret the coordinator only
+listens on loopback addresses.
+
+    F1_DISTRIBUTED_SECRET=... python distributed.py worker coordinator-host:5007
+"""
+import argparse
+import hashlib
+import hmac
+import ipaddress
+import os
+import pickle
+import queue
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+# --- PYTHON 3.11+ COMPATIBILITY FIX ---
+import inspect
+if not hasattr(inspect, 'getargspec'):
+    inspect.getargspec = inspect.getfullargspec
+# --------------------------------------
+
+import simulation
+import speciation
+import ui_layout
+
+DEFAULT_PORT = 5007
+SECRET_ENV = "F1_DISTRIBUTED_SECRET"
+MAX_ATTEMPTS = 3 # Tries per batch before the generation fails
+MAX_MESSAGE = 64 << 20 # Bytes; a batch of genomes with its config is far smaller
+_MAX_HELLO = 256 # Bytes allowed before a worker has authenticated
+_HEADER = struct.Struct("!Q")
+_NONCE_SIZE = 32
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+# --- WIRE FORMAT ---
+def shared_secret():
+    return os.environ.get(SECRET_ENV, "").encode()
+
+def session_key(secret, nonce):
+    return hmac.new(secret, nonce, hashlib.sha256).digest()
+
+def send_message(sock, message, key):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_HEADER.pack(len(data)) + hmac.new(key, data, hashlib.sha256).digest() + data)
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk: raise EOFError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def recv_message(sock, key, max_size=MAX_MESSAGE):
+    """The next message, unpickled only if its signature matches key.
+
+    A length over max_size is refused before any of the body is read.
+    """
+    size, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > max_size:
+        raise ConnectionError(f"Message of {size} bytes is over the {max_size} byte limit")
+    digest = _recv_exact(sock, _DIGEST_SIZE)
+    data = _recv_exact(sock, size)
+    if not hmac.compare_digest(digest, hmac.new(key, data, hashlib.sha256).digest()):
+        raise ConnectionError("Message failed authentication")
+    return pickle.loads(data)
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port) if port else DEFAULT_PORT)
+
+def map_digest(filename):
+    """Hash of the map image and its manifest, so a worker never scores on a different map."""
+    h = hashlib.sha1()
+    stem = os.path.splitext(filename)[0]
+    for path in (os.path.join(simulation.MAP_DIR, filename), os.path.join(simulation.MAP_DIR, stem + ".json")):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+# --- COORDINATOR ---
+class DistributedEvaluator:
+    """Hands genome batches to connected workers and gathers their fitness.
+
+    tracks is a list of (filename, scale) pairs; every worker scores each
+    genome on all of them, exactly like simulation.evaluate_on_tracks.
+    secret defaults to shared_secret(); without one, address must be a
+    loopback address.
+    """
+
+    def __init__(self, address, tracks, zoom, max_frames, batch_size=8, task_timeout=120.0, secret=None):
+        self.tracks = [(f, s, map_digest(f)) for f, s in tracks]
+        self.zoom = zoom
+        self.max_frames = max_frames
+        self.batch_size = batch_size
+        self.task_timeout = task_timeout
+        self.secret = shared_secret() if secret is None else secret
+
+        self.tasks = queue.Queue()
+        self.lock = threading.Condition()
+        self.results = {}
+        self.attempts = {} # Task id -> failed tries this generation
+        self.failure = None # Why the generation failed, once a batch runs out of attempts
+        self.generation = 0
+        self.workers = 0
+        self.requeued = 0
+        self.running = True
+        self.local_workers = []
+
+        self.server = socket.create_server(parse_address(address), reuse_port=False)
+        host = self.server.getsockname()[0]
+        if not self.secret and not ipaddress.ip_address(host).is_loopback:
+            self.server.close()
+            raise ValueError(f"Set {SECRET_ENV} to accept workers on {host}; without it only loopback is allowed")
+        self.server.settimeout(0.5)
+        self.address = "%s:%d" % self.server.getsockname()[:2]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def start_local_workers(self, count):
+        """Spawns worker processes on this machine, connected to this coordinator."""
+        script = os.path.abspath(__file__)
+        env = dict(os.environ, **{SECRET_ENV: self.secret.decode()})
+        for _ in range(count):
+            self.local_workers.append(subprocess.Popen([sys.executable, script, "worker", self.address, "--once"],
+                                                       cwd=os.path.dirname(script), env=env))
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._serve_worker, args=(conn,), daemon=True).start()
+
+    def _authenticate(self, conn):
+        """Session key of a worker that signed its hello with the shared secret, else None."""
+        nonce = os.urandom(_NONCE_SIZE)
+        key = session_key(self.secret, nonce)
+        try:
+            conn.settimeout(self.task_timeout)
+            conn.sendall(nonce)
+            if recv_message(conn, key, _MAX_HELLO) == ("hello",): return key
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        print("Rejected a worker that failed authentication")
+        return None
+
+    def _retry(self, task, reason):
+        """Puts a failed batch back in the queue, or fails the generation after MAX_ATTEMPTS tries."""
+        generation, task_id = task[1], task[2]
+        with self.lock:
+            if generation != self.generation: return
+            self.attempts[task_id] = self.attempts.get(task_id, 0) + 1
+            if self.attempts[task_id] >= MAX_ATTEMPTS:
+                self.failure = f"Batch {task_id} failed {MAX_ATTEMPTS} times, last: {reason}"
+                self.lock.notify_all()
+                return
+        self.tasks.put(task)
+
+    def _serve_worker(self, conn):
+        key = self._authenticate(conn)
+        if key is None:
+            conn.close()
+            return
+        with self.lock:
+            self.workers += 1
+        try:
+            while self.running:
+                try:
+                    task = self.tasks.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                generation, task_id = task[1], task[2]
+                with self.lock:
+                    done = generation != self.generation or task_id in self.results
+                if done:
+                    continue # Stale or already answered by another worker
+                try:
+                    conn.settimeout(self.task_timeout)
+                    send_message(conn, task, key)
+                    reply = recv_message(conn, key)
+                except (OSError, EOFError, pickle.UnpicklingError) as e:
+                    print(f"Worker lost ({e.__class__.__name__}), re-queueing batch {task_id}")
+                    with self.lock:
+                        self.requeued += 1
+                    self._retry(task, f"worker lost ({e!r})")
+                    return
+                if reply[0] == "error":
+                    print(f"Worker failed on batch {task_id}: {reply[3]}")
+                    self._retry(task, reply[3])
+                    continue
+                _, reply_generation, reply_id, fitness, behaviour = reply
+                with self.lock:
+                    if reply_generation == self.generation and reply_id not in self.results:
+                        self.results[reply_id] = (fitness, behaviour)
+                        self.lock.notify_all()
+        finally:
+            with self.lock:
+                self.workers -= 1
+            try:
+                send_message(conn, ("stop",), key)
+            except OSError:
+                pass
+            conn.close()
+
+    def evaluate(self, genomes, config, on_progress=None):
+        """Scores (genome_id, genome) pairs; same signature as a NEAT fitness function.
+
+        on_progress(done, total, workers) is called about twice a second and
+        may return False to abandon the generation (fitness is then left at 0).
+        Returns the behaviour descriptors (see simulation.behaviour_descriptor)
+        of the genomes that were scored, by genome id. Raises RuntimeError
+        with the worker's error once a batch has failed MAX_ATTEMPTS times.
+        """
+        batches = [genomes[i:i + self.batch_size] for i in range(0, len(genomes), self.batch_size)]
+        with self.lock:
+            self.generation += 1
+            self.results = {}
+            self.attempts = {}
+            self.failure = None
+        for task_id, batch in enumerate(batches):
+            self.tasks.put(("task", self.generation, task_id, self.tracks, self.zoom, self.max_frames,
+                            config, [g for _, g in batch]))
+
+        with self.lock:
+            while len(self.results) < len(batches):
+                self.lock.wait(0.5)
+                if self.failure is not None:
+                    self.generation += 1
+                    raise RuntimeError(self.failure)
+                if on_progress is not None:
+                    if on_progress(len(self.results), len(batches), self.workers) is False:
+                        self.generation += 1 # Anything still in flight is now stale
+                        break
+            results = dict(self.results)
+
+        behaviours = {}
+        for task_id, batch in enumerate(batches):
+            fitness, behaviour = results.get(task_id, ([0.0] * len(batch), None))
+            for (_, genome), f in zip(batch, fitness):
+                genome.fitness = f
+            if behaviour is not None:
+                behaviours.update(zip((gid for gid, _ in batch), behaviour))
+        return behaviours
+
+    def __call__(self, genomes, config):
+        self.evaluate(genomes, config)
+
+    def close(self):
+        self.running = False
+        self.server.close()
+        for proc in self.local_workers:
+            proc.terminate()
+        for proc in self.local_workers:
+            proc.wait()
+
+# --- WORKER ---
+class Worker:
+    """Pulls genome batches from a coordinator and scores them headless."""
+
+    def __init__(self, address, once=False, secret=None):
+        self.address = parse_address(address)
+        self.once = once # Exit instead of reconnecting when the coordinator goes away
+        self.secret = shared_secret() if secret is None else secret
+        self.stacks = {} # Built track stacks, keyed by the coordinator's track list
+
+    def stack_for(self, tracks):
+        key = tuple(tracks)
+        stack = self.stacks.get(key)
+        if stack is None:
+            for filename, _, digest in tracks:
+                if map_digest(filename) != digest:
+                    raise RuntimeError(f"Local copy of {filename} differs from the coordinator's")
+            stack = self.stacks[key] = simulation.TrackStack(simulation.Track(f, s) for f, s, _ in tracks)
+        return stack
+
+    def run(self, retry_seconds=2.0):
+        while True:
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError:
+                if self.once: return
+                time.sleep(retry_seconds)
+                continue
+            print(f"Connected to coordinator {self.address[0]}:{self.address[1]}")
+            try:
+                key = session_key(self.secret, _recv_exact(sock, _NONCE_SIZE))
+                send_message(sock, ("hello",), key)
+                while True:
+                    message = recv_message(sock, key)
+                    if message[0] == "stop": return
+                    _, generation, task_id, tracks, zoom, max_frames, config, genomes = message
+                    try:
+                        fitness, behaviour = simulation.evaluate_on_tracks(genomes, config, self.stack_for(tracks),
+                                                                           zoom, max_frames, behaviour=True)
+                    except Exception as e:
+                        print(f"Batch {task_id} failed: {e!r}")
+                        send_message(sock, ("error", generation, task_id, repr(e)), key)
+                        continue
+                    send_message(sock, ("result", generation, task_id, [float(f) for f in fitness], behaviour), key)
+            except (OSError, EOFError):
+                if self.once: return
+                print("Lost the coordinator, reconnecting")
+                time.sleep(retry_seconds)
+            finally:
+                sock.close()
+
+# --- VERIFY ---
+def verify(workers, checkpoint, maps, view, zoom, max_frames):
+    """Scores one generation serially and over local workers, and compares."""
+    import neat
+    if checkpoint:
+        population = neat.Checkpointer.restore_checkpoint(checkpoint)
+        config = population.config
+    else:
+        config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction, speciation.CachedSpeciesSet,
+                                    neat.DefaultStagnation, "config.txt")
+        population = neat.Population(config)
+    genomes = list(population.population.items())
+    game_width = ui_layout.game_view_width(view[0])
+    tracks = [simulation.Track.fit_to_view(f, game_width, view[1], zoom) for f in maps or simulation.list_maps()]
+
+    start = time.perf_counter()
+    serial = simulation.evaluate_on_tracks([g for _, g in genomes], config, simulation.TrackStack(tracks),
+                                           zoom, max_frames)
+    serial_time = time.perf_counter() - start
+
+    evaluator = DistributedEvaluator("127.0.0.1:0", [(t.filename, t.scale) for t in tracks], zoom, max_frames,
+                                     batch_size=max(1, len(genomes) // (workers * 2)))
+    evaluator.start_local_workers(workers)
+    try:
+        start = time.perf_counter()
+        evaluator.evaluate(genomes, config)
+        distributed_time = time.perf_counter() - start
+    finally:
+        evaluator.close()
+
+    mismatches = sum(1 for (_, g), f in zip(genomes, serial) if g.fitness != float(f))
+    print(f"{len(genomes)} genomes x {len(tracks)} tracks: serial {serial_time:.2f}s, "
+          f"{workers} workers {distributed_time:.2f}s, {mismatches} mismatches")
+    return mismatches == 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed NEAT evaluation")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="Evaluate batches for a coordinator")
+    worker.add_argument("address", help=f"Coordinator HOST:PORT (default port {DEFAULT_PORT})")
+    worker.add_argument("--once", action="store_true", help="Exit when the coordinator disconnects")
+    check = sub.add_parser("verify", help="Compare local-worker results with serial evaluation")
+    check.add_argument("--workers", type=int, default=2)
+    check.add_argument("--checkpoint")
+    check.add_argument("--maps", nargs="*")
+    check.add_argument("--view", default="1920x1080")
+    check.add_argument("--zoom", type=float, default=2.5)
+    check.add_argument("--frames", type=int, default=3600)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        Worker(args.address, args.once).run()
+    else:
+        view = tuple(int(v) for v in args.view.lower().split("x"))
+        ok = verify(args.workers, args.checkpoint, args.maps, view, args.zoom, args.frames)
+        sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Fitness memoization for genomes that reappear unchanged between generations.
+
+Elites are copied into the next generation as-is, so once evaluation is
+deterministic their fitness can be looked up instead of re-simulated.
+"""
+import hashlib
+from collections import OrderedDict
+
+def genome_fingerprint(genome):
+    """Structural hash of everything that affects how a genome drives.
+
+    Covers node biases, responses, activations and aggregations and every
+    connection's weight and enabled flag. The genome key and its fitness are
+    deliberately left out: two identical networks share one fingerprint.
+    """
+    h = hashlib.sha1()
+    for key in sorted(genome.nodes):
+        n = genome.nodes[key]
+        h.update(repr((key, n.bias, n.response, n.activation, n.aggregation)).encode())
+    h.update(b"|")
+    for key in sorted(genome.connections):
+        c = genome.connections[key]
+        h.update(repr((key, c.weight, c.enabled)).encode())
+    return h.hexdigest()
+
+class FitnessCache:
+    """Bounded LRU map from (genome fingerprint, evaluation context) to fitness.
+
+    The context should capture everything else that changes a score: the
+    track(s), the simulation scale and budget and the network's input/output
+    layout.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, genome, context):
+        key = (genome_fingerprint(genome), context)
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return fitness
+
+    def put(self, genome, context, fitness):
+        key = (genome_fingerprint(genome), context)
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def apply(self, genomes, context):
+        """Fills in cached fitness and returns the (genome_id, genome) pairs still to simulate."""
+        pending = []
+        for genome_id, genome in genomes:
+            fitness = self.get(genome, context)
+            if fitness is None:
+                pending.append((genome_id, genome))
+            else:
+                genome.fitness = fitness
+        return pending
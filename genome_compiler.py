@@ -0,0 +1,109 @@
+"""Compiles feed-forward NEAT genomes into straight-line Python functions.
+
+neat.nn.FeedForwardNetwork.activate walks its node list and a value
+dictionary on every call. For single-car inference (the visual loop, the
+leader view, replays and drive mode) it is cheaper to generate one function
+per genome with every weight, bias and response inlined as a constant,
+disabled or unreachable connections left out, and zero-weight terms dropped
+from sums.
+
+The generated code computes the same expressions in the same order as
+FeedForwardNetwork, so its outputs are identical.
+"""
+import math
+from collections import OrderedDict
+
+from neat.graphs import feed_forward_layers
+
+from fitness_cache import genome_fingerprint
+
+# Activations emitted as inline expressions of z; anything else is called by name.
+INLINE_ACTIVATIONS = {
+    "tanh": "_tanh(max(-60.0, min(60.0, 2.5 * z)))",
+    "sigmoid": "1.0 / (1.0 + _exp(-max(-60.0, min(60.0, 5.0 * z))))",
+    "relu": "z if z > 0.0 else 0.0",
+    "identity": "z",
+    "clamped": "max(-1.0, min(1.0, z))",
+    "abs": "abs(z)",
+}
+
+def network_source(genome, input_keys, output_keys, name="activate"):
+    """Returns the Python source of the genome's network as a single function.
+
+    Also returns the names of the non-inlined activation and aggregation
+    functions the source refers to.
+    """
+    connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+    layers, required = feed_forward_layers(input_keys, output_keys, connections)
+    required_with_inputs = required.union(input_keys)
+
+    var = {k: f"i{i}" for i, k in enumerate(input_keys)}
+    lines = [f"def {name}(inputs):",
+             f"    {', '.join(var[k] for k in input_keys)}{',' if len(input_keys) == 1 else ''} = inputs"]
+    activations, aggregations = set(), set()
+
+    for layer in layers:
+        for node in sorted(layer):
+            ng = genome.nodes[node]
+            weights = [(i, genome.connections[(i, o)].weight) for i, o in connections
+                       if o == node and i in required_with_inputs]
+            if ng.aggregation == "sum":
+                # A zero-weight term adds nothing to a sum; for max, min, product etc. it still counts
+                terms = [f"{var[i]} * {w!r}" for i, w in weights if w != 0.0]
+                s = " + ".join(terms) if terms else "0"
+            else:
+                aggregations.add(ng.aggregation)
+                terms = [f"{var[i]} * {w!r}" for i, w in weights]
+                s = f"_agg_{ng.aggregation}([{', '.join(terms)}])"
+            z = f"{ng.bias!r} + ({s})" if ng.response == 1.0 else f"{ng.bias!r} + {ng.response!r} * ({s})"
+
+            var[node] = f"n{node}" if node >= 0 else f"h{-node}"
+            lines.append(f"    z = {z}")
+            template = INLINE_ACTIVATIONS.get(ng.activation)
+            if template is None:
+                activations.add(ng.activation)
+                template = f"_act_{ng.activation}(z)"
+            lines.append(f"    {var[node]} = {template}")
+
+    outputs = ", ".join(var.get(k, "0.0") for k in output_keys)
+    lines.append(f"    return [{outputs}]")
+    return "\n".join(lines), activations, aggregations
+
+def compile_network(genome, input_keys, output_keys, activation_defs, aggregation_defs):
+    """Builds the generated function; the defs are neat's activation/aggregation function sets."""
+    source, activations, aggregations = network_source(genome, input_keys, output_keys)
+    namespace = {"_tanh": math.tanh, "_exp": math.exp}
+    for name in activations:
+        namespace[f"_act_{name}"] = activation_defs.get(name)
+    for name in aggregations:
+        namespace[f"_agg_{name}"] = aggregation_defs.get(name)
+    exec(compile(source, f"<genome {getattr(genome, 'key', '?')}>", "exec"), namespace)
+    fn = namespace["activate"]
+    fn.source = source
+    return fn
+
+def compile_genome(genome, config):
+    gc = config.genome_config
+    return compile_network(genome, gc.input_keys, gc.output_keys, gc.activation_defs, gc.aggregation_function_defs)
+
+class CompiledNetworkCache:
+    """Bounded cache of compiled networks keyed by genome key.
+
+    The structural fingerprint is part of the key, so a restarted population
+    that reuses genome keys never picks up a stale network.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, genome, config):
+        key = (genome.key, genome_fingerprint(genome))
+        fn = self.entries.get(key)
+        if fn is None:
+            fn = self.entries[key] = compile_genome(genome, config)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return fn
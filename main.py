@@ -1,11 +1,13 @@
 import pygame
+import argparse
+import atexit
 import os
 import math
 import sys
 import threading
 import time
 import traceback
-import glob # Added for Map scanning
+import types
 
 # --- PYTHON 3.11+ COMPATIBILITY FIX ---
 import inspect
@@ -14,6 +16,19 @@ if not hasattr(inspect, 'getargspec'):
 # --------------------------------------
 
 import neat
+import numpy as np
+
+import distributed
+import map_browser
+import novelty
+import recorder
+import simulation
+import spatial_grid
+import speciation
+import track_tiles
+import ui_layout
+from fitness_cache import FitnessCache
+from genome_compiler import CompiledNetworkCache
 
 pygame.init()
 
@@ -25,55 +40,108 @@ SCREEN = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.FULLSCREE
 pygame.display.set_caption("F1 NEAT Evolution")
 
 # --- CONFIGURATION ---
-UI_PERCENTAGE = 0.25
-UI_WIDTH = int(SCREEN_WIDTH * UI_PERCENTAGE)
-GAME_WIDTH = SCREEN_WIDTH - UI_WIDTH
+GAME_WIDTH = ui_layout.game_view_width(SCREEN_WIDTH)
+UI_WIDTH = SCREEN_WIDTH - GAME_WIDTH
 TRACK_X_OFFSET = UI_WIDTH
 
 # --- CAMERA CONFIG ---
 ZOOM_FACTOR = 2.5 
 CAMERA_SMOOTHING = 0.1 
 
+# --- VIEW ZOOM ---
+# Mouse wheel or +/- zoom the main view, 0 resets. The track is drawn from
+# mip-mapped tiles (see track_tiles.py), so the zoom never rescales the map.
+VIEW_ZOOM_MIN = 0.1
+VIEW_ZOOM_MAX = 4.0
+VIEW_ZOOM_SMOOTHING = 0.15
+view_zoom = 1.0 # Zoom the main view is drawn at
+view_zoom_target = 1.0
+view_zoom_smooth = 1.0 # Eases towards the target; until it arrives, view_zoom is its track_tiles.snap_zoom()
+
+# --- EVALUATION BUDGET (SUCCESSIVE HALVING) ---
+# Every generation is raced in rungs: at each frame budget the cars still
+# running are ranked by fitness and only the top HALVING_KEEP fraction keeps
+# driving. The last rung ends the generation. The window and --multi-track
+# race the rungs; --distributed does not, since a genome's score must not
+# depend on the other genomes in its worker's batch.
+SIM_FPS = 60
+HALVING_RUNGS = (900, 3600, 14400, 36000)
+HALVING_KEEP = 1 / 3
+
+# --- RACING MODE ---
+# Cars crash into each other and radars see other cars. Off by default;
+# fitness then depends on the whole field, so it is never cached.
+RACING_MODE = False
+
+# --- RECORDING ---
+# --record PATH hands every displayed frame to a background encoder (see
+# recorder.py), which drops frames rather than slowing the game down.
+RECORDER = None
+
+# --- NOVELTY SEARCH ---
+# --novelty WEIGHT mixes how unusual each car's route was (see novelty.py)
+# into its fitness, so the population does not all settle on one trick.
+NOVELTY = None
+
+def start_recording(path):
+    global RECORDER
+    RECORDER = recorder.FrameRecorder(path, fps=SIM_FPS)
+    atexit.register(RECORDER.close)
+
 # --- GLOBAL ASSETS ---
-TRACK = None
+TRACK_TILES = None
+TRACK_MASK = None # Off-track flag per world pixel, indexed [y, x]
+TRACK_MANIFEST = None
 scaled_width = 0
 scaled_height = 0
 original_width = 0
 original_height = 0
 CURRENT_TRACK_FILE = "track2.png" # Default
 
+def prepare_track(filename, progress=lambda fraction: None):
+    """Loads, scales and classifies a map without touching the globals; safe off the main thread."""
+    image = pygame.image.load(os.path.join("map", filename)).convert()
+    progress(0.2)
+    width, height = image.get_size()
+    track_scale = simulation.track_scale(width, height, GAME_WIDTH, SCREEN_HEIGHT, ZOOM_FACTOR)
+    manifest = simulation.TrackManifest.for_map(filename)
+    mask = manifest.classify_scaled(image, int(width * track_scale), int(height * track_scale),
+                                    lambda fraction: progress(0.2 + 0.8 * fraction))
+    return types.SimpleNamespace(filename=filename, image=image, scale=track_scale, manifest=manifest, mask=mask)
+
+def install_track(loaded):
+    """Makes a prepared map current. Only call between generations, never mid-race."""
+    global TRACK_TILES, TRACK_MASK, TRACK_MANIFEST, scaled_width, scaled_height, original_width, original_height, scale, CURRENT_TRACK_FILE
+    CURRENT_TRACK_FILE = loaded.filename
+    original_width, original_height = loaded.image.get_size()
+    scale = loaded.scale
+    scaled_width = int(original_width * scale)
+    scaled_height = int(original_height * scale)
+    TRACK_TILES = track_tiles.TiledTrack(loaded.image, scale, (GAME_WIDTH, SCREEN_HEIGHT))
+    TRACK_MANIFEST = loaded.manifest
+    TRACK_MASK = loaded.mask
+
 def load_track_asset(filename):
     """Loads and scales the track, updating global variables."""
-    global TRACK, scaled_width, scaled_height, original_width, original_height, scale, CURRENT_TRACK_FILE
-    
-    path = os.path.join("map", filename)
-    if not os.path.exists(path):
-        print(f"Warning: {filename} not found, defaulting to track.png")
-        path = os.path.join("map", "track2.png")
-        filename = "track.png"
+    if not os.path.exists(os.path.join("map", filename)):
+        print(f"Warning: {filename} not found, defaulting to track2.png")
+        filename = "track2.png"
 
     try:
-        temp_track = pygame.image.load(path).convert()
+        loaded = prepare_track(filename)
     except FileNotFoundError:
-        print("Error: map/track.png not found. Please ensure the file exists.")
+        print("Error: map/track2.png not found. Please ensure the file exists.")
         pygame.quit()
         sys.exit()
-
-    CURRENT_TRACK_FILE = filename
-    original_width, original_height = temp_track.get_width(), temp_track.get_height()
-
-    # Scale Track
-    base_scale_x = GAME_WIDTH / original_width
-    base_scale_y = SCREEN_HEIGHT / original_height
-    scale = min(base_scale_x, base_scale_y) * ZOOM_FACTOR
-
-    scaled_width = int(original_width * scale)
-    scaled_height = int(original_height * scale)
-    TRACK = pygame.transform.scale(temp_track, (scaled_width, scaled_height))
+    install_track(loaded)
 
 # Initial Load
 load_track_asset("track2.png")
 
+# Map switching from the pause menu happens in the background; the loaded
+# track is installed when the next generation starts.
+MAP_BROWSER = map_browser.MapBrowser("map", (200, 112), prepare_track)
+
 # Fonts
 try:
     FONT_MAIN = pygame.font.SysFont("Consolas", int(18), bold=True)
@@ -116,11 +184,13 @@ COLOR_BLUE = (0, 191, 255)
 
 BEST_OVERALL_LAP = float('inf')
 
-def format_time(ms):
-    minutes = int(ms // 60000)
-    seconds = int((ms % 60000) // 1000)
-    milliseconds = int(ms % 1000)
-    return f"{minutes}:{seconds:02}.{milliseconds:03}"
+# Fitness of genomes whose evaluation ran to completion, so unchanged elites skip the simulation
+FITNESS_CACHE = FitnessCache(max_entries=4096)
+# Straight-line per-genome networks for single-car inference
+NETWORK_CACHE = CompiledNetworkCache(max_entries=1024)
+
+def frames_to_ms(frames):
+    return frames * 1000.0 / SIM_FPS
 
 def draw_rounded_button(surface, color, rect, text_surf):
     """Draws a button with rounded corners."""
@@ -148,6 +218,15 @@ def draw_ui_buttons(surface):
     label_reset = FONT_MAIN.render("Reset", True, BUTTON_TEXT_COLOR)
     draw_chamfered_button(surface, RESET_BUTTON_COLOR, RESET_BUTTON_RECT, label_reset)
     
+def draw_map_loading(surface):
+    """Progress bar while a map picked in the pause menu loads in the background."""
+    if not MAP_BROWSER.loading: return
+    bar = pygame.Rect(UI_WIDTH + 20, SCREEN_HEIGHT - 44, 260, 24)
+    pygame.draw.rect(surface, (40, 40, 40), bar)
+    pygame.draw.rect(surface, COLOR_BLUE, (bar.x, bar.y, int(bar.w * MAP_BROWSER.progress), bar.h))
+    label = FONT_MAIN.render(f"Loading {MAP_BROWSER.loading}", True, COLOR_TEXT_WHITE)
+    surface.blit(label, label.get_rect(center=bar.center))
+    
 def _monitor_buttons_thread():
     global manual_reset, quit_flag
     pressed = False
@@ -246,25 +325,35 @@ def handle_pause_menu(screen):
         elif menu_state == "maps":
             draw_centered_text(screen, "SELECT MAP", FONT_MENU, COLOR_TEXT_WHITE, -200)
             
-            # Find map files in assets
-            map_files = glob.glob(os.path.join("map", "*.png"))
-            map_files = [os.path.basename(f) for f in map_files if "car" not in f] # Exclude car.png
-            if not map_files: map_files = ["track.png"]
-            
-            start_y = SCREEN_HEIGHT // 2 - 100
+            if MAP_BROWSER.error:
+                draw_centered_text(screen, f"Load failed: {MAP_BROWSER.error}", FONT_MAIN, COLOR_RED, -165)
+            map_files = MAP_BROWSER.maps()
+            card_w, card_h, gap = 220, 150, 20
+            per_row = max(1, min(len(map_files), 4))
+            left = SCREEN_WIDTH // 2 - (per_row * card_w + (per_row - 1) * gap) // 2
+            start_y = SCREEN_HEIGHT // 2 - 140
             for i, f_name in enumerate(map_files):
-                btn_rect = pygame.Rect(SCREEN_WIDTH//2 - 150, start_y + (i * 50), 300, 40)
+                card = pygame.Rect(left + (i % per_row) * (card_w + gap), start_y + (i // per_row) * (card_h + gap), card_w, card_h)
                 
-                # Highlight current map
-                is_current = (f_name == CURRENT_TRACK_FILE)
-                col = COLOR_GREEN if is_current else (60, 60, 60)
-                if btn_rect.collidepoint((mx, my)): col = COLOR_PURPLE
+                # Highlight current map and the one loading
+                col = (60, 60, 60)
+                if f_name == CURRENT_TRACK_FILE: col = COLOR_GREEN
+                if f_name == MAP_BROWSER.loading: col = COLOR_BLUE
+                if card.collidepoint((mx, my)): col = COLOR_PURPLE
+                pygame.draw.rect(screen, col, card, border_radius=10)
                 
-                draw_rounded_button(screen, col, btn_rect, FONT_MAIN.render(f_name, True, COLOR_TEXT_WHITE))
+                thumb = MAP_BROWSER.thumbnail(f_name)
+                thumb_area = pygame.Rect(card.x + 10, card.y + 8, card_w - 20, 112)
+                if thumb:
+                    screen.blit(thumb, thumb.get_rect(center=thumb_area.center))
+                else:
+                    pygame.draw.rect(screen, (30, 30, 30), thumb_area)
+                name = f"{f_name} {int(MAP_BROWSER.progress * 100)}%" if f_name == MAP_BROWSER.loading else f_name
+                label = FONT_MAIN.render(name, True, COLOR_TEXT_WHITE)
+                screen.blit(label, label.get_rect(center=(card.centerx, card.bottom - 16)))
                 
-                if click and btn_rect.collidepoint((mx, my)):
-                    load_track_asset(f_name)
-                    manual_reset = True # Restart generation
+                if click and card.collidepoint((mx, my)) and f_name != MAP_BROWSER.loading:
+                    MAP_BROWSER.load(f_name) # Swapped in when it is ready, see eval_genomes
                     paused = False # Close menu
             
             back_rect = pygame.Rect(SCREEN_WIDTH//2 - 50, SCREEN_HEIGHT - 100, 100, 40)
@@ -296,97 +385,106 @@ def handle_pause_menu(screen):
 
         pygame.display.update()
 
-class Car(pygame.sprite.Sprite):
+# Car positions are whole pixels: pygame.Rect rounds float centres half away from zero.
+def _round_half_away(v):
+    return math.copysign(math.floor(abs(v) + 0.5), v)
+
+# pygame.math.Vector2(0.8, 0).rotate() is exact at multiples of 90 degrees
+_QUARTER_TURN_HEADINGS = ((0.8, 0.0), (-0.0, 0.8), (-0.8, -0.0), (0.0, -0.8), (0.8, 0.0))
+
+def _off_track(x, y):
+    # Off-track colours come from the map's manifest, see simulation.TrackManifest
+    max_h, max_w = TRACK_MASK.shape
+    if x < 0 or x >= max_w or y < 0 or y >= max_h: return True
+    return TRACK_MASK[y, x]
+
+class CarState:
+    """Physics, lap and sensor state of one car as plain numbers, updated in place every step.
+
+    Nothing here touches pygame surfaces; CarRenderer draws the car.
+    """
+    __slots__ = ("car_id", "x", "y", "start_x", "start_y", "angle", "vel_x", "vel_y", "rotation_vel",
+                 "speed", "max_speed", "scale", "sensor_range", "alive", "time_alive", "stuck_frames",
+                 "distance_travelled", "last_x", "last_y",
+                 "lap_started", "lap_completed", "current_lap_time", "lap_start_time", "lap_times", "personal_best",
+                 "current_steer", "target_steer", "current_accel", "target_accel", "current_brake", "target_brake",
+                 "radar_dist", "radar_x", "radar_y", "inputs", "trail")
+
+    STEER_SMOOTHING = 1.0
+    ACCEL_SMOOTHING = 1.0
+
     def __init__(self, car_id):
-        super().__init__()
         self.car_id = car_id
-        try:
-            self.original_image = pygame.image.load(os.path.join("assets", "car.png")).convert_alpha()
-        except FileNotFoundError:
-            self.original_image = pygame.Surface((30, 50))
-            self.original_image.fill((255, 0, 0))
 
-        car_scale = scale * 0.2
-        self.original_image = pygame.transform.scale(self.original_image, (int(self.original_image.get_width() * car_scale), int(self.original_image.get_height() * car_scale)))
-        self.image = self.original_image
-        
         # --- FIXED START POSITION LOGIC ---
-        is_new_track = (CURRENT_TRACK_FILE == "track2.png" or original_width == 1792)
-        
-        if is_new_track:
-            raw_x, raw_y = 1427, 1263
-            start_angle = 0 
-        else:
-            raw_x, raw_y = 490, 820
-            start_angle = 0
-
-        self.start_pos = (raw_x * (scaled_width / original_width), 
-                          raw_y * (scaled_height / original_height))
-        
-        self.rect = self.image.get_rect(center=self.start_pos)
-        self.vel_vector = pygame.math.Vector2(0.8, 0)
-        self.angle = start_angle
-        self.rotation_vel = 7 * (ZOOM_FACTOR * 0.8) 
+        raw_x, raw_y = TRACK_MANIFEST.start
+        self.start_x = raw_x * (scaled_width / original_width)
+        self.start_y = raw_y * (scaled_height / original_height)
+        self.x = _round_half_away(self.start_x)
+        self.y = _round_half_away(self.start_y)
+        self.last_x, self.last_y = self.x, self.y
+
+        self.angle = TRACK_MANIFEST.start_angle
+        self.vel_x, self.vel_y = 0.8, 0.0
+        self.rotation_vel = 7 * (ZOOM_FACTOR * 0.8)
+        self.speed = 2.0
+        self.max_speed = 35 * (ZOOM_FACTOR * 0.8)
+        self.scale = scale
+        self.sensor_range = TRACK_MANIFEST.sensor_range
         self.alive = True
-        self.radars = []
+        self.time_alive = 0
+        self.stuck_frames = 0
+        self.distance_travelled = 0.0
+
         self.lap_started = False
         self.lap_completed = False
         self.current_lap_time = 0
         self.lap_start_time = 0
         self.lap_times = []
         self.personal_best = float('inf')
-        self.speed = 2.0 
-        self.max_speed = 35 * (ZOOM_FACTOR * 0.8) 
-        self.scale = scale
-        self.last_pos = pygame.math.Vector2(self.rect.center)
-        self.stuck_frames = 0
-        self.distance_travelled = 0.0
-        self.time_alive = 0 
-        
+
         self.current_steer = 0.0
         self.target_steer = 0.0
         self.current_accel = 0.0
         self.target_accel = 0.0
         self.current_brake = 0.0
         self.target_brake = 0.0
-        
-        self.STEER_SMOOTHING = 1.0 
-        self.ACCEL_SMOOTHING = 1.0
 
-    def update(self, is_leader=False):
+        rays = len(simulation.RADAR_ANGLES)
+        self.radar_dist = [0] * rays
+        self.radar_x = [0] * rays # Where each ray stopped
+        self.radar_y = [0] * rays
+        self.inputs = [0] * (rays + 1)
+        self.trail = [] # Positions sampled for novelty search
+
+    def update(self):
         self.time_alive += 1
-        
+
         if self.time_alive < 30:
             self.target_accel = 1.0
             self.target_brake = 0.0
 
         self.smooth_controls()
-        self.radars.clear()
         self.drive()
         self.check_lap()
         self.rotate()
-        
-        if is_leader: self.image.set_alpha(255) 
-        else: self.image.set_alpha(100)
 
-        for radar_angle in (-60, -30, 0, 30, 60):
-            self.radar(radar_angle, draw=is_leader)
-            
+        for i, radar_angle in enumerate(simulation.RADAR_ANGLES):
+            self.radar(i, radar_angle)
+
         self.collision()
-        
+
         if self.time_alive > 240 and self.speed < 0.5: self.alive = False
         if abs(self.current_steer) > 0.8 and self.speed < 3.0 and self.time_alive > 120: self.alive = False
-            
-        current_pos = pygame.math.Vector2(self.rect.center)
-        moved_dist = (current_pos - self.last_pos).length()
 
-        if moved_dist < 0.5: self.stuck_frames += 1
+        if math.hypot(self.x - self.last_x, self.y - self.last_y) < 0.5: self.stuck_frames += 1
         else: self.stuck_frames = 0
-        self.last_pos = current_pos
+        self.last_x, self.last_y = self.x, self.y
 
         if self.stuck_frames > 90: self.alive = False
 
-        self.data()
+        if self.time_alive % simulation.BEHAVIOUR_INTERVAL == 0 and len(self.trail) < simulation.BEHAVIOUR_SAMPLES:
+            self.trail.append((self.x, self.y))
 
     def smooth_controls(self):
         self.current_steer += (self.target_steer - self.current_steer) * self.STEER_SMOOTHING
@@ -394,37 +492,38 @@ class Car(pygame.sprite.Sprite):
         self.current_brake += (self.target_brake - self.current_brake) * self.ACCEL_SMOOTHING
 
     def drive(self):
-        torque = 0.5 
-        if self.speed > 15: torque = 0.15 
+        torque = 0.5
+        if self.speed > 15: torque = 0.15
 
         self.speed += (self.current_accel * torque)
         brake_power = 0.3
         if self.speed < 5: brake_power = 0.05
-            
-        self.speed -= (self.current_brake * brake_power) 
-        self.speed *= 0.99 
+
+        self.speed -= (self.current_brake * brake_power)
+        self.speed *= 0.99
         self.speed = max(0, min(self.max_speed, self.speed))
-        self.rect.center += self.vel_vector * self.speed
-        self.distance_travelled += self.speed   
+        self.x = _round_half_away(self.x + self.vel_x * self.speed)
+        self.y = _round_half_away(self.y + self.vel_y * self.speed)
+        self.distance_travelled += self.speed
 
     def check_lap(self):
         global BEST_OVERALL_LAP
         if self.lap_started and self.alive:
-             self.current_lap_time = pygame.time.get_ticks() - self.lap_start_time
+             self.current_lap_time = frames_to_ms(self.time_alive - self.lap_start_time)
 
         if not self.lap_started:
-            if math.sqrt((self.rect.center[0] - self.start_pos[0])**2 + (self.rect.center[1] - self.start_pos[1])**2) > 50 * self.scale:
+            if math.sqrt((self.x - self.start_x)**2 + (self.y - self.start_y)**2) > 50 * self.scale:
                 self.lap_started = True
-                self.lap_start_time = pygame.time.get_ticks()
-        
+                self.lap_start_time = self.time_alive
+
         if self.lap_started and not self.lap_completed:
-            if math.sqrt((self.rect.center[0] - self.start_pos[0])**2 + (self.rect.center[1] - self.start_pos[1])**2) < 50 * self.scale:
+            if math.sqrt((self.x - self.start_x)**2 + (self.y - self.start_y)**2) < 50 * self.scale:
                 self.lap_completed = True
-                final_time = pygame.time.get_ticks() - self.lap_start_time
+                final_time = frames_to_ms(self.time_alive - self.lap_start_time)
                 self.lap_times.append(final_time)
                 if final_time < self.personal_best: self.personal_best = final_time
                 if final_time < BEST_OVERALL_LAP: BEST_OVERALL_LAP = final_time
-                self.max_speed = min(self.max_speed + 5, 100) 
+                self.max_speed = min(self.max_speed + 5, 100)
                 self.lap_started = False
                 self.lap_completed = False
                 self.lap_start_time = 0
@@ -432,113 +531,86 @@ class Car(pygame.sprite.Sprite):
 
     def collision(self):
         length = 40 * self.scale
-        right_pt = [int(self.rect.center[0] + math.cos(math.radians(self.angle + 18)) * length),
-                    int(self.rect.center[1] - math.sin(math.radians(self.angle + 18)) * length)]
-        left_pt  = [int(self.rect.center[0] + math.cos(math.radians(self.angle - 18)) * length),
-                    int(self.rect.center[1] - math.sin(math.radians(self.angle - 18)) * length)]
-
-        max_w, max_h = TRACK.get_width(), TRACK.get_height()
-        is_new_track = (CURRENT_TRACK_FILE == "track2.png" or original_width == 1792)
-
-        def is_collision(pt):
-            if pt[0] < 0 or pt[0] >= max_w or pt[1] < 0 or pt[1] >= max_h: return True
-            try:
-                pixel_color = TRACK.get_at(pt)
-                
-                if is_new_track:
-                    r, g, b, a = pixel_color
-                    '''
-                    This is for the collision detection logic
-                    where the give colors are considered as off-track.
-                    You can modify these color checks to fit your custom track design.
-                    add pixel_color checks as needed.
-                    add the conditions as needed
-                    '''
-                    # 1. Check for Specific Yellow Wall
-                    if pixel_color == (247, 255, 42, 255):
-                        return True
-                    if pixel_color == (131,145,60,255) or pixel_color == (228,205,163,255):
-                        return True
-                        
-                    # 2. Check for Grass (Green dominant)
-                    if (g > r + 30 and g > b + 30):
-                        return True
-                        
-                    # 3. Check for Buildings (Blue dominant)
-                    if (b > r + 30 and b > g + 30):
-                        return True
-                        
-                    return False
-                else:
-                    return pixel_color == pygame.Color(2, 105, 31, 255)
-            except: return True
-
-        if is_collision(right_pt) or is_collision(left_pt):
+        right_x = int(self.x + math.cos(math.radians(self.angle + 18)) * length)
+        right_y = int(self.y - math.sin(math.radians(self.angle + 18)) * length)
+        left_x = int(self.x + math.cos(math.radians(self.angle - 18)) * length)
+        left_y = int(self.y - math.sin(math.radians(self.angle - 18)) * length)
+        if _off_track(right_x, right_y) or _off_track(left_x, left_y):
             self.alive = False
 
     def rotate(self):
         turn_amount = self.rotation_vel * self.current_steer
         self.angle -= turn_amount
-        self.vel_vector = pygame.math.Vector2(0.8, 0).rotate(-self.angle)
-        self.image = pygame.transform.rotozoom(self.original_image, self.angle, 1)
-        self.rect = self.image.get_rect(center=self.rect.center)
+        # Same arithmetic as pygame.math.Vector2(0.8, 0).rotate(-self.angle)
+        turn = math.fmod(-self.angle * math.pi / 180.0, 2 * math.pi)
+        if turn < 0: turn += 2 * math.pi
+        if math.fmod(turn + 1e-6, math.pi / 2) < 2e-6:
+            self.vel_x, self.vel_y = _QUARTER_TURN_HEADINGS[int((turn + 1e-6) / (math.pi / 2))]
+        else:
+            self.vel_x = math.cos(turn) * 0.8 - math.sin(turn) * 0.0
+            self.vel_y = math.sin(turn) * 0.8 + math.cos(turn) * 0.0
 
-    def radar(self, radar_angle, draw=True):
+    def radar(self, i, radar_angle):
         length = 0
-        x = int(self.rect.center[0])
-        y = int(self.rect.center[1])
-        max_w, max_h = TRACK.get_width(), TRACK.get_height()
-        is_new_track = (CURRENT_TRACK_FILE == "track2.png" or original_width == 1792)
+        x = int(self.x)
+        y = int(self.y)
+        dx = math.cos(math.radians(self.angle + radar_angle))
+        dy = math.sin(math.radians(self.angle + radar_angle))
+        max_h, max_w = TRACK_MASK.shape
 
-        while length < 300 * self.scale:
+        while length < self.sensor_range * self.scale:
             if x < 0 or x >= max_w or y < 0 or y >= max_h: break
-            try:
-                pixel_color = TRACK.get_at((x, y))
-                is_unsafe = False
-                
-                if is_new_track:
-                    r, g, b, a = pixel_color
-                    
-                    
-                    '''
-                    This is the place to change the 
-                    track color specifications
-                    so that the raders can works perfectly
-                    with custom tracks.
-                    '''
-                    # 1. Check for Specific Yellow Wall
-                    if pixel_color == (247, 255, 42, 255):
-                        is_unsafe = True
-                    if pixel_color == (131,145,60,255) or pixel_color == (228,205,163,255):
-                        is_unsafe = True
-                    # 2. Check for Grass
-                    elif (g > r + 30 and g > b + 30):
-                         is_unsafe = True
-                    # 3. Check for Buildings
-                    elif (b > r + 30 and b > g + 30):
-                         is_unsafe = True
-
-                else:
-                    if pixel_color == pygame.Color(2, 105, 31, 255):
-                        is_unsafe = True
-                
-                if is_unsafe: break
-            except IndexError: break
+            if TRACK_MASK[y, x]: break
             length += 1
-            x = int(self.rect.center[0] + math.cos(math.radians(self.angle + radar_angle)) * length)
-            y = int(self.rect.center[1] - math.sin(math.radians(self.angle + radar_angle)) * length)
+            x = int(self.x + dx * length)
+            y = int(self.y - dy * length)
 
-        dist = int(math.sqrt(math.pow(self.rect.center[0] - x, 2) + math.pow(self.rect.center[1] - y, 2)))
-        self.radars.append([radar_angle, dist, (x, y)])
+        self.radar_dist[i] = int(math.sqrt(math.pow(self.x - x, 2) + math.pow(self.y - y, 2)))
+        self.radar_x[i] = x
+        self.radar_y[i] = y
 
     def data(self):
-        input_data = [0, 0, 0, 0, 0, 0]
-        for i, radar in enumerate(self.radars):
-            normalized_dist = int(radar[1]) / (300.0 * self.scale)
-            input_data[i] = 1.0 - max(0.0, min(1.0, normalized_dist))
-        input_data[5] = self.speed / self.max_speed
+        """Network inputs; the same list is refilled every call."""
+        input_data = self.inputs
+        if self.time_alive: # Radars are first cast by update()
+            for i, dist in enumerate(self.radar_dist):
+                normalized_dist = int(dist) / (self.sensor_range * self.scale)
+                input_data[i] = 1.0 - max(0.0, min(1.0, normalized_dist))
+        input_data[-1] = self.speed / self.max_speed
         return input_data
 
+class CarRenderer:
+    """The car sprite for every CarState at one track scale."""
+
+    def __init__(self, track_scale):
+        self.scale = track_scale
+        try:
+            image = pygame.image.load(os.path.join("assets", "car.png")).convert_alpha()
+        except FileNotFoundError:
+            image = pygame.Surface((30, 50))
+            image.fill((255, 0, 0))
+        car_scale = track_scale * 0.2
+        self.original_image = pygame.transform.scale(image, (int(image.get_width() * car_scale), int(image.get_height() * car_scale)))
+        self.rotated = {} # Car id -> (angle, image), so a car driving straight is not rotated again
+
+    def image(self, car, is_leader=False):
+        """The sprite turned to the car's heading; only the leader is drawn opaque."""
+        cached = self.rotated.get(car.car_id)
+        if cached is None or cached[0] != car.angle:
+            cached = self.rotated[car.car_id] = (car.angle, pygame.transform.rotozoom(self.original_image, car.angle, 1))
+        image = cached[1]
+        image.set_alpha(255 if is_leader else 100)
+        return image
+
+_car_renderer = None
+
+def get_car_renderer():
+    """The CarRenderer for the current track's scale."""
+    global _car_renderer
+    if _car_renderer is None or _car_renderer.scale != scale:
+        _car_renderer = CarRenderer(scale)
+    return _car_renderer
+
 def draw_f1_leaderboard(screen, cars):
     COLOR_HEADER_BG = (215, 80, 65)
     COLOR_ROW_BG = (28, 32, 38)
@@ -551,7 +623,7 @@ def draw_f1_leaderboard(screen, cars):
     header_height = 45
     row_height = 36
     
-    active_cars = [group.sprite for group in cars if group.sprite.alive]
+    active_cars = [car for car in cars if car.alive]
     active_cars.sort(key=lambda x: x.distance_travelled, reverse=True)
     
     pygame.draw.rect(screen, COLOR_ROW_BG, (0, 0, UI_WIDTH, SCREEN_HEIGHT))
@@ -585,8 +657,8 @@ def draw_f1_leaderboard(screen, cars):
         lap_rect = lap_txt.get_rect(midleft=(start_x + 150, text_y_center))
         screen.blit(lap_txt, lap_rect)
         
-        if car.lap_times: t_str = format_time(car.lap_times[-1])
-        else: t_str = format_time(car.current_lap_time)
+        if car.lap_times: t_str = ui_layout.format_time(car.lap_times[-1])
+        else: t_str = ui_layout.format_time(car.current_lap_time)
             
         time_txt = FONT_MAIN.render(t_str, True, COLOR_TEXT_MAIN)
         time_rect = time_txt.get_rect(midright=(UI_WIDTH - 15, text_y_center))
@@ -609,8 +681,7 @@ def draw_telemetry_panel(screen, cars):
     screen.blit(header_text, (start_x + 10, start_y + 5))
     visible_cars = int((total_height - header_height - 10) / row_height)
     for i in range(min(len(cars), visible_cars)):
-        car_group = cars[i]
-        car = car_group.sprite
+        car = cars[i]
         y_pos = start_y + header_height + (i * row_height) + 5
         id_text = FONT_MAIN.render(f"{car.car_id}", True, COLOR_TEXT_WHITE if car.alive else COLOR_TEXT_GREY)
         screen.blit(id_text, (start_x + 10, y_pos))
@@ -649,11 +720,12 @@ def draw_chase_cam(screen, leader):
     lens = pygame.Surface((int(VIEW_SIZE), int(VIEW_SIZE)))
     lens.fill((30, 30, 30))
     if leader:
-        offset_x = -leader.rect.centerx + (VIEW_SIZE / 2)
-        offset_y = -leader.rect.centery + (VIEW_SIZE / 2)
-        lens.blit(TRACK, (offset_x, offset_y))
-        car_draw_pos = (int(VIEW_SIZE/2 - leader.image.get_width()/2), int(VIEW_SIZE/2 - leader.image.get_height()/2))
-        lens.blit(leader.image, car_draw_pos)
+        offset_x = -leader.x + (VIEW_SIZE / 2)
+        offset_y = -leader.y + (VIEW_SIZE / 2)
+        TRACK_TILES.draw(lens, (offset_x, offset_y), 1.0)
+        image = get_car_renderer().image(leader, is_leader=True)
+        car_draw_pos = (int(VIEW_SIZE/2 - image.get_width()/2), int(VIEW_SIZE/2 - image.get_height()/2))
+        lens.blit(image, car_draw_pos)
 
     final_view = pygame.transform.scale(lens, (int(CAM_SIZE), int(CAM_SIZE)))
     screen.blit(final_view, (cam_x, cam_y))
@@ -789,9 +861,136 @@ def draw_neural_network(screen, genome, config, car, inputs, outputs):
         pygame.draw.rect(screen, COLOR_YELLOW, (bar_start_x + 40, current_y + 5, fill_width, 8), border_radius=4)
         pygame.draw.circle(screen, COLOR_YELLOW, (bar_start_x + 40 + fill_width, current_y + 9), 5)
         
+def apply_controls(car, raw):
+    """Maps the four network outputs (left, right, brake, gas) onto the car's targets."""
+    steer_left  = raw[0]
+    steer_right = raw[1]
+    target_steer = steer_right - steer_left
+    if abs(target_steer) < 0.2: target_steer = 0.0
+    car.target_steer = max(-1.0, min(1.0, target_steer))
+    car.target_brake = max(0.0, min(1.0, (raw[2] + 1) / 2.0))
+    car.target_accel = max(0.0, min(1.0, (raw[3] + 1) / 2.0))
+
+def handle_view_zoom(event):
+    """Mouse wheel and +/- set the main view's zoom target, 0 resets it."""
+    global view_zoom_target
+    if event.type == pygame.MOUSEWHEEL:
+        view_zoom_target *= 1.15 ** event.y
+    elif event.type == pygame.KEYDOWN:
+        if event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS): view_zoom_target *= 1.25
+        elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS): view_zoom_target /= 1.25
+        elif event.key in (pygame.K_0, pygame.K_KP0): view_zoom_target = 1.0
+    view_zoom_target = max(VIEW_ZOOM_MIN, min(VIEW_ZOOM_MAX, view_zoom_target))
+
+def world_to_view(x, y, cam_x, cam_y):
+    """Screen position of world point (x, y) in the main view, zoomed about its centre."""
+    center_x = UI_WIDTH + (GAME_WIDTH / 2)
+    center_y = SCREEN_HEIGHT / 2
+    return ((x - cam_x - center_x) * view_zoom + center_x, (y - cam_y - center_y) * view_zoom + center_y)
+
+def follow_camera(leader, cam_x, cam_y):
+    global view_zoom, view_zoom_smooth
+    view_zoom_smooth += (view_zoom_target - view_zoom_smooth) * VIEW_ZOOM_SMOOTHING
+    if abs(view_zoom_target - view_zoom_smooth) < 1e-3: view_zoom_smooth = view_zoom_target
+    view_zoom = view_zoom_smooth if view_zoom_smooth == view_zoom_target else track_tiles.snap_zoom(view_zoom_smooth)
+    game_center_x = UI_WIDTH + (GAME_WIDTH / 2)
+    game_center_y = SCREEN_HEIGHT / 2
+    target_cam_x = leader.x - game_center_x
+    target_cam_y = leader.y - game_center_y
+    cam_x += (target_cam_x - cam_x) * CAMERA_SMOOTHING
+    cam_y += (target_cam_y - cam_y) * CAMERA_SMOOTHING
+    return cam_x, cam_y
+
+def draw_track_view(screen, cars, leader, cam_x, cam_y):
+    """Draws the track, the live cars and the leader's radars, then the empty UI column."""
+    screen.fill((20, 20, 20))
+    game_view_rect = pygame.Rect(UI_WIDTH, 0, GAME_WIDTH, SCREEN_HEIGHT)
+    screen.set_clip(game_view_rect)
+    TRACK_TILES.draw(screen, world_to_view(0, 0, cam_x, cam_y), view_zoom)
+    
+    renderer = get_car_renderer()
+    for car in cars:
+        if car.alive:
+            image = renderer.image(car, car is leader)
+            rect = image.get_rect(center=(car.x, car.y))
+            draw_pos = world_to_view(rect.x, rect.y, cam_x, cam_y)
+            if view_zoom != 1.0: image = pygame.transform.rotozoom(image, 0, view_zoom)
+            screen.blit(image, draw_pos)
+            if car is leader and car.time_alive:
+                adj_start = world_to_view(car.x, car.y, cam_x, cam_y)
+                for end_x, end_y in zip(car.radar_x, car.radar_y):
+                    adj_end = world_to_view(end_x, end_y, cam_x, cam_y)
+                    pygame.draw.line(screen, (255, 255, 255), adj_start, adj_end, 1)
+                    pygame.draw.circle(screen, (0, 255, 0), (int(adj_end[0]), int(adj_end[1])), 3)
+
+    screen.set_clip(None)
+    pygame.draw.rect(screen, COLOR_UI_BG, (0, 0, UI_WIDTH, SCREEN_HEIGHT))
+    pygame.draw.line(screen, (50, 50, 50), (UI_WIDTH, 0), (UI_WIDTH, SCREEN_HEIGHT), 2)
+
+_racing_grid = None
+
+def race_interactions(cars, ghosts):
+    """Racing mode: crashes cars that touch and shortens radars that hit another car.
+
+    ghosts is the generation's spatial_grid.GhostPairs.
+    """
+    global _racing_grid
+    live = [c for c in cars if c.alive]
+    if len(live) < 2: return
+    reach = TRACK_MANIFEST.sensor_range * scale
+    car_radius = simulation.CAR_RADIUS * scale
+    if _racing_grid is None or _racing_grid.cell_size != reach + 2 * car_radius:
+        _racing_grid = spatial_grid.SpatialHashGrid(reach + 2 * car_radius)
+
+    x = np.array([c.x for c in live], dtype=float)
+    y = np.array([c.y for c in live], dtype=float)
+    angle = np.array([c.angle for c in live], dtype=float)
+    ids = np.array([c.car_id for c in live], dtype=np.int64)
+    radar_dist = np.array([c.radar_dist for c in live], dtype=float)
+    radar_end = np.stack([np.array([c.radar_x for c in live], dtype=float),
+                          np.array([c.radar_y for c in live], dtype=float)], axis=2)
+    crashed = spatial_grid.interact(_racing_grid, x, y, angle, None, ids, ghosts, simulation.RADAR_ANGLES,
+                                    radar_dist, radar_end, car_radius, reach)
+
+    for k, car in enumerate(live):
+        if crashed[k]: car.alive = False
+        for r in range(len(car.radar_dist)):
+            if radar_dist[k, r] < car.radar_dist[r]:
+                car.radar_dist[r] = int(radar_dist[k, r])
+                car.radar_x[r], car.radar_y[r] = int(radar_end[k, r, 0]), int(radar_end[k, r, 1])
+
+def race_rung(cars, genomes, entrants):
+    """Ranks the entrants still running and retires all but the top HALVING_KEEP of them.
+
+    Entrants that already crashed have finished: they are neither promoted
+    nor counted, so they cannot take a running car's place. Returns the
+    indices promoted to the next rung, the ones retired, and the best fitness
+    among the retired, so promoted genomes can be kept above it.
+    """
+    promoted, retired = simulation.halving_rung([genomes[idx][1].fitness for idx in entrants],
+                                                [cars[idx].alive for idx in entrants], HALVING_KEEP)
+    promoted, retired = [entrants[k] for k in promoted], [entrants[k] for k in retired]
+    for idx in retired:
+        cars[idx].alive = False
+    floor = max((genomes[idx][1].fitness for idx in retired), default=None)
+    return promoted, retired, floor
+
+def car_behaviour(cars):
+    """simulation.behaviour_descriptor() of each car; a car that stopped early stays where it stopped."""
+    final = [(c.x, c.y) for c in cars]
+    trail = [c.trail + [(c.x, c.y)] * (simulation.BEHAVIOUR_SAMPLES - len(c.trail)) for c in cars]
+    return simulation.behaviour_descriptor(final, trail, [(scaled_width, scaled_height)] * len(cars))
+
 def eval_genomes(genomes, config):
     global quit_flag, BEST_OVERALL_LAP, show_telemetry, manual_reset, show_network
     manual_reset = False 
+    loaded = MAP_BROWSER.take_ready()
+    if loaded: install_track(loaded)
+
+    cache_context = ("visual", CURRENT_TRACK_FILE, scale, ZOOM_FACTOR, HALVING_RUNGS, HALVING_KEEP,
+                     config.genome_config.num_inputs, config.genome_config.num_outputs)
+    population = genomes
+    genomes = FITNESS_CACHE.apply(genomes, cache_context)
     
     cars = []
     nets = []
@@ -800,10 +999,8 @@ def eval_genomes(genomes, config):
     
     car_id_counter = 1
     for _, genome in genomes:
-        car_group = pygame.sprite.GroupSingle(Car(car_id_counter))
-        cars.append(car_group)
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
-        nets.append(net)
+        cars.append(CarState(car_id_counter))
+        nets.append(NETWORK_CACHE.get(genome, config))
         genome.fitness = 0
         car_id_counter += 1
         
@@ -812,12 +1009,25 @@ def eval_genomes(genomes, config):
     cam_x = 0
     cam_y = 0
     run = True
+
+    frame = 0
+    rung = 0
+    entrants = list(range(len(cars)))
+    fitness_floors = {}
+    retired = set()
+    timed_out = False
+    racing_ghosts = spatial_grid.GhostPairs()
     
     while run:
+        if MAP_BROWSER.ready: manual_reset = True # End the generation so the new map can be installed
         if manual_reset: run = False
-        if (pygame.time.get_ticks() - start_time) > 600000: run = False
+        if (pygame.time.get_ticks() - start_time) > 600000:
+            run = False
+            timed_out = True
+        frame += 1
 
         for event in pygame.event.get():
+            handle_view_zoom(event)
             if event.type == pygame.QUIT:
                 quit_flag = True
                 run = False
@@ -831,7 +1041,7 @@ def eval_genomes(genomes, config):
                     # If menu caused a manual reset (new map), break loop
                     if manual_reset: run = False
 
-        alive_cars = [c.sprite for c in cars if c.sprite.alive]
+        alive_cars = [c for c in cars if c.alive]
         leader = None
         leader_genome = None
         leader_inputs = []
@@ -839,42 +1049,32 @@ def eval_genomes(genomes, config):
         
         if alive_cars:
             best_dist = -1
-            for idx, c_group in enumerate(cars):
-                c = c_group.sprite
+            for idx, c in enumerate(cars):
                 if c.alive and c.distance_travelled > best_dist:
                     best_dist = c.distance_travelled
                     leader = c
                     leader_genome = genomes[idx][1]
 
-        for i, car_group in enumerate(cars):
-            car = car_group.sprite
+        for i, car in enumerate(cars):
             if not car.alive: continue
 
             car_inputs = car.data()
-            if len(car_inputs) > len(nets[i].input_nodes):
-                car_inputs = car_inputs[:len(nets[i].input_nodes)]
+            if len(car_inputs) > config.genome_config.num_inputs:
+                car_inputs = car_inputs[:config.genome_config.num_inputs]
 
             if car.time_alive < 30:
                  raw = [0, 0, 0, 0]
             else:
-                 raw = nets[i].activate(car_inputs)
+                 raw = nets[i](car_inputs)
                  while len(raw) < 4: raw = list(raw) + [0.0]
 
-            if car == leader:
+            if car is leader:
                 leader_inputs = car_inputs
                 leader_outputs = raw
 
-            if car.time_alive >= 30:
-                steer_left  = raw[0]
-                steer_right = raw[1]
-                target_steer = steer_right - steer_left
-                if abs(target_steer) < 0.2: target_steer = 0.0
-                car.target_steer = max(-1.0, min(1.0, target_steer))
-                car.target_brake = max(0.0, min(1.0, (raw[2] + 1) / 2.0))
-                car.target_accel = max(0.0, min(1.0, (raw[3] + 1) / 2.0))
+            if car.time_alive >= 30: apply_controls(car, raw)
 
-            is_leader = (car == leader)
-            car.update(is_leader=is_leader)
+            car.update()
 
             if math.isfinite(car.speed):
                 genomes[i][1].fitness += car.speed * 0.1
@@ -885,37 +1085,11 @@ def eval_genomes(genomes, config):
                 genomes[i][1].fitness -= 2 
                 car.alive = False
 
-        if leader:
-            game_center_x = UI_WIDTH + (GAME_WIDTH / 2)
-            game_center_y = SCREEN_HEIGHT / 2
-            target_cam_x = leader.rect.centerx - game_center_x
-            target_cam_y = leader.rect.centery - game_center_y
-            cam_x += (target_cam_x - cam_x) * CAMERA_SMOOTHING
-            cam_y += (target_cam_y - cam_y) * CAMERA_SMOOTHING
+        if RACING_MODE: race_interactions(cars, racing_ghosts)
 
-        SCREEN.fill((20, 20, 20))
-        game_view_rect = pygame.Rect(UI_WIDTH, 0, GAME_WIDTH, SCREEN_HEIGHT)
-        SCREEN.set_clip(game_view_rect)
-        SCREEN.blit(TRACK, (0 - cam_x, 0 - cam_y))
-        
-        for i, car_group in enumerate(cars):
-            car = car_group.sprite
-            if car.alive:
-                draw_pos = (car.rect.x - cam_x, car.rect.y - cam_y)
-                SCREEN.blit(car.image, draw_pos)
-                if car == leader:
-                    for r_data in car.radars:
-                        if len(r_data) >= 3:
-                            end_pt = r_data[2]
-                            start_pt = car.rect.center
-                            adj_start = (start_pt[0] - cam_x, start_pt[1] - cam_y)
-                            adj_end = (end_pt[0] - cam_x, end_pt[1] - cam_y)
-                            pygame.draw.line(SCREEN, (255, 255, 255), adj_start, adj_end, 1)
-                            pygame.draw.circle(SCREEN, (0, 255, 0), (int(adj_end[0]), int(adj_end[1])), 3)
-
-        SCREEN.set_clip(None)
-        pygame.draw.rect(SCREEN, COLOR_UI_BG, (0, 0, UI_WIDTH, SCREEN_HEIGHT))
-        pygame.draw.line(SCREEN, (50, 50, 50), (UI_WIDTH, 0), (UI_WIDTH, SCREEN_HEIGHT), 2)
+        if leader: cam_x, cam_y = follow_camera(leader, cam_x, cam_y)
+
+        draw_track_view(SCREEN, cars, leader, cam_x, cam_y)
 
         draw_f1_leaderboard(SCREEN, cars)
         if leader: draw_chase_cam(SCREEN, leader)
@@ -924,8 +1098,7 @@ def eval_genomes(genomes, config):
             draw_neural_network(SCREEN, leader_genome, config, leader, leader_inputs, leader_outputs)
         draw_ui_buttons(SCREEN)
 
-        for i, car_group in enumerate(cars):
-            car = car_group.sprite
+        for i, car in enumerate(cars):
             genome = genomes[i][1]
             if car.lap_completed and car.lap_times:
                 last_lap = car.lap_times[-1]      
@@ -935,22 +1108,201 @@ def eval_genomes(genomes, config):
                 genome.fitness += time_bonus
                 car.lap_completed = False
 
+        if frame >= HALVING_RUNGS[rung]:
+            if rung == len(HALVING_RUNGS) - 1:
+                run = False
+            else:
+                promoted, retired_now, floor = race_rung(cars, genomes, entrants)
+                retired.update(retired_now)
+                entrants = promoted
+                if floor is not None:
+                    for idx in entrants: fitness_floors[idx] = max(fitness_floors.get(idx, floor), floor)
+                print(f"Rung {rung + 1}/{len(HALVING_RUNGS)}: {len(entrants)} genomes promoted at frame {frame}")
+                rung += 1
+
+        draw_map_loading(SCREEN)
         pygame.display.update()
+        if RECORDER: RECORDER.capture(SCREEN)
         clock.tick(60)
 
-        if all(not car_group.sprite.alive for car_group in cars): run = False
+        if all(not car.alive for car in cars): run = False
+
+    # Only episodes that ran their full course on their own are reproducible.
+    if not (manual_reset or quit_flag or timed_out or RACING_MODE):
+        for idx, (_, genome) in enumerate(genomes):
+            if idx not in retired:
+                FITNESS_CACHE.put(genome, cache_context, genome.fitness)
+
+    # A promoted genome must never rank below one that was retired before it.
+    for idx, floor in fitness_floors.items():
+        genomes[idx][1].fitness = max(genomes[idx][1].fitness, floor)
 
     if quit_flag: sys.exit(0)
+    if NOVELTY:
+        behaviours = dict(zip((gid for gid, _ in genomes), car_behaviour(cars))) if cars else {}
+        NOVELTY.apply(population, behaviours, ("visual", CURRENT_TRACK_FILE, scale))
+
+# --- MULTI-TRACK EVALUATION ---
+MULTI_TRACK_FILES = [] # Empty means every map in map/
+_track_stack = None
+
+def get_track_stack():
+    """Loads every evaluation map once into a single stacked off-track array."""
+    global _track_stack
+    if _track_stack is None:
+        files = MULTI_TRACK_FILES or simulation.list_maps()
+        _track_stack = simulation.TrackStack(
+            simulation.Track.fit_to_view(f, GAME_WIDTH, SCREEN_HEIGHT, ZOOM_FACTOR) for f in files)
+    return _track_stack
+
+def eval_genomes_multi_track(genomes, config):
+    """Scores every genome on every map in one headless, batched pass.
+
+    A genome's fitness is its mean fitness over the maps. The genomes race
+    the same HALVING_RUNGS as in eval_genomes.
+    """
+    global quit_flag, manual_reset
+    manual_reset = False
+    stack = get_track_stack()
+    max_frames = HALVING_RUNGS[-1]
+    halving = simulation.Halving(HALVING_RUNGS[:-1], HALVING_KEEP)
+
+    cache_context = ("multi-track", tuple(t.filename for t in stack.tracks), tuple(stack.scales), ZOOM_FACTOR,
+                     max_frames, config.genome_config.num_inputs, config.genome_config.num_outputs,
+                     HALVING_RUNGS, HALVING_KEEP)
+    population = genomes
+    genomes = FITNESS_CACHE.apply(genomes, cache_context)
+
+    def on_frame(sim):
+        global quit_flag
+        if sim.frame % 30: return True
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT: quit_flag = True
 
-def run(config_path):
+        SCREEN.fill((20, 20, 20))
+        draw_centered_text(SCREEN, "MULTI-TRACK EVALUATION", FONT_MENU, COLOR_TEXT_WHITE, -60)
+        draw_centered_text(SCREEN, f"{len(genomes)} genomes x {len(stack)} tracks", FONT_HEADER, COLOR_TEXT_GREY, 0)
+        draw_centered_text(SCREEN, f"Frame {sim.frame} - {int(sim.alive.sum())} cars running", FONT_HEADER, COLOR_TEXT_GREY, 30)
+        draw_ui_buttons(SCREEN)
+        pygame.display.update()
+        return not (quit_flag or manual_reset)
+
+    fitness, behaviour = simulation.evaluate_on_tracks([g for _, g in genomes], config, stack, ZOOM_FACTOR,
+                                                       max_frames, on_frame, racing=RACING_MODE, behaviour=True,
+                                                       halving=halving)
+    for (_, genome), f, retired in zip(genomes, fitness, halving.retired):
+        genome.fitness = float(f)
+        if not (quit_flag or manual_reset or RACING_MODE or retired):
+            FITNESS_CACHE.put(genome, cache_context, genome.fitness)
+
+    if quit_flag: sys.exit(0)
+    if NOVELTY: NOVELTY.apply(population, dict(zip((gid for gid, _ in genomes), behaviour)), cache_context[:3])
+
+DISTRIBUTED_ADDRESS = None
+LOCAL_WORKERS = 0
+_evaluator = None
+
+def get_evaluator():
+    global _evaluator
+    if _evaluator is None:
+        stack = get_track_stack()
+        _evaluator = distributed.DistributedEvaluator(
+            DISTRIBUTED_ADDRESS, [(t.filename, t.scale) for t in stack.tracks], ZOOM_FACTOR, HALVING_RUNGS[-1])
+        _evaluator.start_local_workers(LOCAL_WORKERS)
+        print("Coordinator listening on", _evaluator.address)
+    return _evaluator
+
+def eval_genomes_distributed(genomes, config):
+    """Multi-track evaluation spread over worker processes; same scores as eval_genomes_multi_track."""
+    global quit_flag, manual_reset
+    manual_reset = False
+    evaluator = get_evaluator()
+    stack = get_track_stack()
+
+    cache_context = ("multi-track", tuple(t.filename for t in stack.tracks), tuple(stack.scales), ZOOM_FACTOR,
+                     HALVING_RUNGS[-1], config.genome_config.num_inputs, config.genome_config.num_outputs)
+    population = genomes
+    genomes = FITNESS_CACHE.apply(genomes, cache_context)
+
+    def on_progress(done, total, workers):
+        global quit_flag
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT: quit_flag = True
+
+        SCREEN.fill((20, 20, 20))
+        draw_centered_text(SCREEN, "DISTRIBUTED EVALUATION", FONT_MENU, COLOR_TEXT_WHITE, -60)
+        draw_centered_text(SCREEN, f"{len(genomes)} genomes x {len(stack)} tracks on {evaluator.address}", FONT_HEADER, COLOR_TEXT_GREY, 0)
+        draw_centered_text(SCREEN, f"{done}/{total} batches - {workers} workers", FONT_HEADER, COLOR_TEXT_GREY, 30)
+        draw_ui_buttons(SCREEN)
+        pygame.display.update()
+        return not (quit_flag or manual_reset)
+
+    behaviours = evaluator.evaluate(genomes, config, on_progress)
+    if not (quit_flag or manual_reset):
+        for _, genome in genomes:
+            FITNESS_CACHE.put(genome, cache_context, genome.fitness)
+
+    if quit_flag:
+        evaluator.close()
+        sys.exit(0)
+    if NOVELTY: NOVELTY.apply(population, behaviours, cache_context[:3])
+
+# --- DRIVE MODE ---
+def drive_champion(genome, activate, map_file):
+    """Drives one exported champion on map_file with no NEAT population behind it.
+
+    The car respawns when it crashes or on R / Reset; close the window or press ESC to stop.
+    """
+    global quit_flag, manual_reset, show_telemetry, show_network
+    load_track_asset(map_file)
+    num_inputs = len(genome.input_keys)
+    cars = [CarState(1)]
+    clock = pygame.time.Clock()
+    cam_x, cam_y = 0, 0
+
+    while not quit_flag:
+        for event in pygame.event.get():
+            handle_view_zoom(event)
+            if event.type == pygame.QUIT: quit_flag = True
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE: quit_flag = True
+                if event.key == pygame.K_r: manual_reset = True
+                if event.key == pygame.K_i: show_telemetry = not show_telemetry
+                if event.key == pygame.K_n: show_network = not show_network
+
+        car = cars[0]
+        if manual_reset or not car.alive:
+            manual_reset = False
+            cars = [CarState(1)]
+            car = cars[0]
+
+        inputs = car.data()[:num_inputs]
+        raw = [0, 0, 0, 0] if car.time_alive < 30 else activate(inputs)
+        if car.time_alive >= 30: apply_controls(car, raw)
+        car.update()
+
+        cam_x, cam_y = follow_camera(car, cam_x, cam_y)
+        draw_track_view(SCREEN, cars, car, cam_x, cam_y)
+        draw_f1_leaderboard(SCREEN, cars)
+        draw_chase_cam(SCREEN, car)
+        if show_telemetry: draw_telemetry_panel(SCREEN, cars)
+        if show_network: draw_neural_network(SCREEN, genome, None, car, inputs, raw)
+        draw_ui_buttons(SCREEN)
+        pygame.display.update()
+        if RECORDER: RECORDER.capture(SCREEN)
+        clock.tick(SIM_FPS)
+
+    pygame.quit()
+
+def run(config_path, eval_function=eval_genomes):
     try:
-        config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+        config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction, speciation.CachedSpeciesSet, neat.DefaultStagnation, config_path)
         pop = neat.Population(config)
         pop.add_reporter(neat.StdOutReporter(True))
         stats = neat.StatisticsReporter()
         pop.add_reporter(stats)
         pop.add_reporter(neat.Checkpointer(5))
-        pop.run(eval_genomes, 5000)
+        pop.run(eval_function, 5000)
     except KeyboardInterrupt:
         print("Evolution stopped by user.")
         pygame.quit()
@@ -971,7 +1323,38 @@ def run(config_path):
         sys.exit()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="F1 NEAT Evolution")
+    parser.add_argument("--multi-track", nargs="*", metavar="MAP",
+                        help="Score genomes headless on several maps at once (default: every map in map/)")
+    parser.add_argument("--racing", action="store_true",
+                        help="Cars collide with each other and radars detect other cars")
+    parser.add_argument("--distributed", nargs="?", const=f"127.0.0.1:{distributed.DEFAULT_PORT}", metavar="HOST:PORT",
+                        help="Multi-track evaluation handed to workers (python distributed.py worker HOST:PORT); "
+                             f"set {distributed.SECRET_ENV} on both sides to listen beyond this machine")
+    parser.add_argument("--local-workers", type=int, default=0,
+                        help="With --distributed: also start this many workers on this machine")
+    parser.add_argument("--record", metavar="PATH",
+                        help="Record the window: a video file (.mp4, .mkv, ... needs ffmpeg) or a directory for PNG frames")
+    parser.add_argument("--novelty", type=float, metavar="WEIGHT",
+                        help="Mix novelty search into fitness: 0 is fitness only, 1 novelty only")
+    args = parser.parse_args()
+    if args.racing and args.distributed:
+        parser.error("--racing scores genomes against each other and cannot be split across workers")
+    RACING_MODE = args.racing
+    if args.record: start_recording(args.record)
+    if args.novelty is not None:
+        if not 0.0 <= args.novelty <= 1.0: parser.error("--novelty WEIGHT must be between 0 and 1")
+        NOVELTY = novelty.NoveltySearch(args.novelty)
+
     local_dir = os.path.dirname(__file__)
     config_path = os.path.join(local_dir, 'config.txt')
     print("Loading config from:", config_path)
-    run(config_path)
\ No newline at end of file
+    if args.distributed:
+        MULTI_TRACK_FILES = args.multi_track or []
+        DISTRIBUTED_ADDRESS, LOCAL_WORKERS = args.distributed, args.local_workers
+        run(config_path, eval_genomes_distributed)
+    elif args.multi_track is not None:
+        MULTI_TRACK_FILES = args.multi_track
+        run(config_path, eval_genomes_multi_track)
+    else:
+        run(config_path)
\ No newline at end of file
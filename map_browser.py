@@ -0,0 +1,112 @@
+"""Map list, thumbnails and background track loading for the pause menu.
+
+The map folder is rescanned at most once a second, and only the scan result
+is kept. Thumbnails and full track loads are jobs for one worker thread, so
+the menu and the game keep drawing while a map is prepared. A finished load
+waits in the browser until the game takes it at a generation boundary.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+
+import pygame
+
+_LOAD, _THUMBNAIL = 0, 1 # Job priorities: a requested map beats thumbnails
+
+class MapBrowser:
+    """prepare(filename, progress) loads one map in the worker thread and returns what the game installs."""
+
+    def __init__(self, map_dir, thumb_size, prepare, rescan_interval=1.0):
+        self.map_dir = map_dir
+        self.thumb_size = thumb_size
+        self.prepare = prepare
+        self.rescan_interval = rescan_interval
+
+        self.mtimes = {} # Map file -> modification time, from the last scan
+        self._next_scan = 0.0
+        self.thumbnails = {} # Map file -> (mtime, surface)
+        self._queued_thumbnails = set()
+
+        self.lock = threading.Lock()
+        self.loading = None # Map file being prepared
+        self.progress = 0.0
+        self.error = None
+        self._ready = None
+        self._load_token = 0
+
+        self._jobs = queue.PriorityQueue()
+        self._order = itertools.count()
+        threading.Thread(target=self._work, daemon=True).start()
+
+    def maps(self):
+        """Sorted map files; the folder is only rescanned every rescan_interval seconds."""
+        now = time.monotonic()
+        if now >= self._next_scan:
+            self._next_scan = now + self.rescan_interval
+            try:
+                with os.scandir(self.map_dir) as entries:
+                    self.mtimes = {e.name: e.stat().st_mtime_ns for e in entries
+                                   if e.name.lower().endswith(".png") and "car" not in e.name}
+            except OSError:
+                self.mtimes = {}
+        return sorted(self.mtimes)
+
+    def thumbnail(self, name):
+        """The cached thumbnail (possibly of an older version of the file), or None while it is generated."""
+        mtime = self.mtimes.get(name)
+        cached = self.thumbnails.get(name)
+        if (cached is None or cached[0] != mtime) and (name, mtime) not in self._queued_thumbnails:
+            self._queued_thumbnails.add((name, mtime))
+            self._jobs.put((_THUMBNAIL, next(self._order), name, mtime))
+        return cached[1] if cached else None
+
+    def load(self, name):
+        """Starts preparing name in the background; a newer request replaces an unfinished one."""
+        with self.lock:
+            self._load_token += 1
+            self.loading = name
+            self.progress = 0.0
+            self.error = None
+            self._ready = None
+            self._jobs.put((_LOAD, next(self._order), name, self._load_token))
+
+    @property
+    def ready(self):
+        return self._ready is not None
+
+    def take_ready(self):
+        """The prepared map, once; None if nothing finished loading."""
+        with self.lock:
+            loaded, self._ready = self._ready, None
+            if loaded is not None: self.loading = None
+            return loaded
+
+    def _set_progress(self, token, fraction):
+        with self.lock:
+            if token == self._load_token: self.progress = fraction
+
+    def _work(self):
+        while True:
+            kind, _, name, tag = self._jobs.get()
+            if kind == _LOAD:
+                if tag != self._load_token: continue # Superseded before it started
+                try:
+                    loaded = self.prepare(name, lambda fraction: self._set_progress(tag, fraction))
+                except Exception as e:
+                    print(f"Loading {name} failed: {e}")
+                    with self.lock:
+                        if tag == self._load_token: self.loading, self.error = None, f"{name}: {e}"
+                    continue
+                with self.lock:
+                    if tag == self._load_token: self._ready, self.progress = loaded, 1.0
+            else:
+                try:
+                    image = pygame.image.load(os.path.join(self.map_dir, name)).convert()
+                    w, h = image.get_size()
+                    fit = min(self.thumb_size[0] / w, self.thumb_size[1] / h)
+                    thumb = pygame.transform.smoothscale(image, (max(1, int(w * fit)), max(1, int(h * fit))))
+                    self.thumbnails[name] = (tag, thumb)
+                except (pygame.error, OSError) as e:
+                    print(f"Thumbnail for {name} failed: {e}") # Stays queued, so it is not retried until the file changes
@@ -0,0 +1,159 @@
+"""Novelty search: reward cars for driving somewhere the others have not.
+
+A car's behaviour descriptor is where it ended and where it was at a few
+fixed times after the start, relative to the track size (see
+simulation.behaviour_descriptor). Its novelty is the mean distance to its k
+nearest neighbours among an archive of past behaviours and the rest of its
+generation. Spinning and crawling cars all end up near the start, so they
+score low novelty, and a car that reaches new parts of the track scores high.
+
+The neighbours come from BehaviourGrid. It projects the descriptors onto
+their two principal directions, buckets them into square cells, and
+searches outwards from a query's cell one ring of cells at a time. The
+distance between two projections never exceeds the distance between the
+descriptors. The search can therefore stop once the k-th best distance is
+closer than the next ring, and the result is still exact. Trajectories along
+one track vary mostly along a few directions (how far a car got and how
+fast), so most of the archive is never compared with a given query.
+"""
+import numpy as np
+
+_CELL_BITS = 21
+_CELL_OFFSET = 1 << (_CELL_BITS - 1)
+_DIRECT_PAIRS = 1 << 18 # Fewer query-point pairs than this are cheaper to compare all at once
+
+def _keys(cx, cy):
+    return ((cx + _CELL_OFFSET) << _CELL_BITS) + (cy + _CELL_OFFSET)
+
+def _ring(r):
+    """Cell offsets (dx, dy) at Chebyshev distance exactly r."""
+    if r == 0: return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    side = np.arange(-r, r + 1)
+    inner = side[1:-1]
+    return (np.concatenate([side, side, np.full(len(inner), -r), np.full(len(inner), r)]),
+            np.concatenate([np.full(len(side), -r), np.full(len(side), r), inner, inner]))
+
+class BehaviourGrid:
+    """Exact k-nearest-neighbour search over descriptors, bucketed by a 2-D projection of them.
+
+    The projection is onto the points' two principal directions. Distances
+    along them never exceed the full distance.
+    """
+
+    def __init__(self, points, cell_size):
+        self.points = np.asarray(points, dtype=float)
+        self.cell_size = float(cell_size)
+        self.centre = self.points.mean(axis=0) if len(self.points) else np.zeros(self.points.shape[1])
+        sample = self.points[::max(1, len(self.points) // 2048)] - self.centre # Plenty to find the axes
+        axes = np.linalg.svd(sample, full_matrices=False)[2][:2].T if len(sample) else np.zeros((0, 2))
+        self.axes = np.zeros((self.points.shape[1], 2))
+        self.axes[:, :axes.shape[1]] = axes
+        cells = self._cells(self.points)
+        keys = _keys(cells[:, 0], cells[:, 1])
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+        self.low = cells.min(axis=0) if len(cells) else np.zeros(2, dtype=np.int64)
+        self.high = cells.max(axis=0) if len(cells) else np.zeros(2, dtype=np.int64)
+
+    def _cells(self, points):
+        return np.floor((points - self.centre) @ self.axes / self.cell_size).astype(np.int64)
+
+    def nearest(self, queries, k, exclude=None):
+        """Distances to the k nearest points of each query, ascending; inf where there are fewer.
+
+        exclude[i] is the index of a point query i must skip (itself), or -1.
+        """
+        queries = np.asarray(queries, dtype=float)
+        best = np.full((len(queries), k), np.inf)
+        if not len(queries) or not len(self.points): return best
+        point_sq = (self.points ** 2).sum(axis=1)
+        if len(queries) * len(self.points) <= _DIRECT_PAIRS:
+            return np.sort(self._merge(best, queries, np.arange(len(queries)), np.arange(len(self.points)),
+                                       point_sq, exclude), axis=1)
+
+        # Queries sharing a cell search the same rings, so each ring is one distance matrix
+        cells = self._cells(queries)
+        keys = _keys(cells[:, 0], cells[:, 1])
+        by_cell = np.argsort(keys, kind="stable")
+        for group in np.split(by_cell, np.flatnonzero(np.diff(keys[by_cell])) + 1):
+            q = queries[group]
+            cx, cy = cells[group[0]]
+            group_best = best[group]
+            last_ring = max(abs(cx - self.low[0]), abs(cx - self.high[0]), abs(cy - self.low[1]), abs(cy - self.high[1]))
+            for r in range(last_ring + 1):
+                dx, dy = _ring(r)
+                target = _keys(cx + dx, cy + dy)
+                lo = np.searchsorted(self.sorted_keys, target, side="left")
+                counts = np.searchsorted(self.sorted_keys, target, side="right") - lo
+                total = counts.sum()
+                if total:
+                    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                    found = self.order[np.repeat(lo, counts) + offsets]
+                    group_best = self._merge(group_best, q, group, found, point_sq, exclude)
+                # Points in farther rings are at least r cells away along a principal direction
+                if group_best.max() <= r * self.cell_size: break
+            best[group] = np.sort(group_best, axis=1)
+        return best
+
+    def _merge(self, best, q, rows, found, point_sq, exclude):
+        """best (unsorted k nearest so far of queries q) updated with the points found."""
+        sq = (q ** 2).sum(axis=1)[:, None] + point_sq[found][None, :] - 2.0 * (q @ self.points[found].T)
+        dist = np.sqrt(np.maximum(sq, 0.0))
+        if exclude is not None:
+            dist[exclude[rows][:, None] == found[None, :]] = np.inf
+        k = best.shape[1]
+        return np.partition(np.concatenate([best, dist], axis=1), k - 1, axis=1)[:, :k]
+
+class NoveltySearch:
+    """Mixes behavioural novelty into each generation's fitness.
+
+    weight 0 leaves fitness unchanged, 1 ranks by novelty alone. In between,
+    fitness and novelty are both scaled to [0, 1] over the generation, mixed,
+    and mapped back onto the generation's fitness range.
+    """
+
+    def __init__(self, weight, k=15, archive_size=5000, archive_per_generation=5, cell_size=0.05):
+        self.weight = weight
+        self.k = k
+        self.archive_size = archive_size
+        self.archive_per_generation = archive_per_generation
+        self.cell_size = cell_size
+        self.context = None
+        self.archive = None
+        self.behaviours = {} # Genome key -> descriptor, for genomes that are not simulated again (elites)
+
+    def novelty(self, descriptors):
+        """Mean distance of each descriptor to its k nearest among the archive and the other descriptors."""
+        points = descriptors if self.archive is None else np.concatenate([descriptors, self.archive])
+        grid = BehaviourGrid(points, self.cell_size)
+        k = min(self.k, len(points) - 1)
+        if k < 1: return np.zeros(len(descriptors))
+        return grid.nearest(descriptors, k, exclude=np.arange(len(descriptors))).mean(axis=1)
+
+    def apply(self, genomes, behaviours, context):
+        """Mixes novelty into the fitness of (genome_id, genome) pairs.
+
+        behaviours maps genome key to descriptor for the genomes simulated this
+        generation; context identifies the track(s), since descriptors from
+        different maps cannot be compared.
+        """
+        if context != self.context:
+            self.context, self.archive, self.behaviours = context, None, {}
+        self.behaviours = {gid: behaviours.get(gid, self.behaviours.get(gid)) for gid, _ in genomes}
+        scored = [(gid, g) for gid, g in genomes if self.behaviours[gid] is not None]
+        if not scored: return
+
+        descriptors = np.array([self.behaviours[gid] for gid, _ in scored])
+        novelty = self.novelty(descriptors)
+        if self.weight:
+            fitness = np.array([g.fitness for _, g in scored], dtype=float)
+            low, span = fitness.min(), np.ptp(fitness) or 1.0
+            novelty_span = np.ptp(novelty) or 1.0
+            mixed = (1 - self.weight) * (fitness - low) / span + self.weight * (novelty - novelty.min()) / novelty_span
+            for (_, genome), f in zip(scored, low + mixed * span):
+                genome.fitness = float(f)
+
+        newest = descriptors[np.argsort(-novelty, kind="stable")[:self.archive_per_generation]]
+        self.archive = newest if self.archive is None else np.concatenate([self.archive, newest])
+        self.archive = self.archive[-self.archive_size:]
+        print(f"Novelty: mean {novelty.mean():.3f}, max {novelty.max():.3f}, archive of {len(self.archive)}")
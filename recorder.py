@@ -0,0 +1,139 @@
+"""Record the game window to a video file or a PNG sequence without stalling it.
+
+capture() copies the frame's pixel buffer into a bounded queue and returns.
+A writer thread pipes queued frames to an encoder process: ffmpeg for video
+files, or this module's own PNG writer for directories. When the encoder
+falls behind and the queue is full, frames are dropped instead of making the
+game wait.
+
+PNG frames are named by capture index, so dropped frames show as gaps. A
+video simply plays them back-to-back.
+"""
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+
+import pygame
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".avi", ".webm")
+_INDEX = struct.Struct("!Q")
+
+def _pixel_format(surface):
+    """ffmpeg pix_fmt of the surface's raw buffer, or None if it needs converting."""
+    if surface.get_pitch() != surface.get_width() * surface.get_bytesize(): return None
+    masks = surface.get_masks()[:3]
+    little = sys.byteorder == "little"
+    if surface.get_bytesize() == 4:
+        if masks == (0xFF0000, 0xFF00, 0xFF): return "bgr0" if little else "0rgb"
+        if masks == (0xFF, 0xFF00, 0xFF0000): return "rgb0" if little else "0bgr"
+    if surface.get_bytesize() == 3:
+        if masks == (0xFF0000, 0xFF00, 0xFF): return "bgr24" if little else "rgb24"
+        if masks == (0xFF, 0xFF00, 0xFF0000): return "rgb24" if little else "bgr24"
+    return None
+
+class FrameRecorder:
+    """Records same-sized frames; call capture() once per frame and close() at the end."""
+
+    def __init__(self, path, fps=60, max_queue_mb=256):
+        self.path = path
+        self.fps = fps
+        self.max_queue_mb = max_queue_mb
+        self.captured = 0
+        self.dropped = 0
+        self.failed = False
+        self.size = None
+        self.frames = None
+        self.process = None
+        self.thread = None
+
+    def _start(self, surface):
+        self.size = width, height = surface.get_size()
+        native = _pixel_format(surface)
+        self.convert = native is None # Otherwise the raw buffer is handed over as is
+        self.pix_fmt = native or "rgb24"
+        frame_bytes = width * height * (4 if "0" in self.pix_fmt else 3)
+        self.frames = queue.Queue(maxsize=max(2, self.max_queue_mb * 2**20 // frame_bytes))
+
+        if self.path.lower().endswith(VIDEO_EXTENSIONS):
+            ffmpeg = shutil.which("ffmpeg")
+            if ffmpeg is None:
+                raise RuntimeError("Recording to a video file needs ffmpeg on PATH; give a directory for PNG frames")
+            command = [ffmpeg, "-loglevel", "error", "-y",
+                       "-f", "rawvideo", "-pix_fmt", self.pix_fmt, "-s", f"{width}x{height}", "-r", str(self.fps),
+                       "-i", "-", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                       "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", self.path]
+            self.indexed = False
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            command = [sys.executable, os.path.abspath(__file__), self.path, str(width), str(height), self.pix_fmt]
+            self.indexed = True
+        # Own session, so Ctrl+C stops the game but the encoder still flushes what was queued
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, start_new_session=True,
+                                        env=dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1"))
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def capture(self, surface):
+        """Queues a copy of surface's pixels, or drops the frame if the encoder is behind."""
+        if self.frames is None:
+            self._start(surface)
+        elif surface.get_size() != self.size:
+            raise ValueError(f"Frame size changed from {self.size} to {surface.get_size()} while recording")
+        index = self.captured
+        self.captured += 1
+        if self.failed or self.frames.full():
+            self.dropped += 1
+            return
+        data = pygame.image.tobytes(surface, "RGB") if self.convert else surface.get_buffer().raw
+        self.frames.put_nowait((index, data))
+
+    def _write_loop(self):
+        pipe = self.process.stdin
+        try:
+            while True:
+                item = self.frames.get()
+                if item is None: break
+                index, data = item
+                if self.indexed: pipe.write(_INDEX.pack(index))
+                pipe.write(data)
+        except OSError:
+            print("Recorder: encoder exited early, recording stopped")
+            self.failed = True
+            while self.frames.get() is not None: pass
+
+    def close(self):
+        if self.frames is None: return
+        self.frames.put(None)
+        self.thread.join()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        self.frames = None
+        print(f"Recorded {self.captured - self.dropped} of {self.captured} frames to {self.path}"
+              f" ({self.dropped} dropped)")
+
+# --- PNG WRITER PROCESS ---
+def write_png_sequence(directory, width, height, pix_fmt, stream):
+    import numpy as np
+    channels = 4 if "0" in pix_fmt else 3
+    order = [pix_fmt.index(c) for c in "rgb"]
+    frame_bytes = width * height * channels
+    while True:
+        header = stream.read(_INDEX.size)
+        if len(header) < _INDEX.size: break
+        index, = _INDEX.unpack(header)
+        data = stream.read(frame_bytes)
+        if len(data) < frame_bytes: break
+        rgb = np.frombuffer(data, dtype=np.uint8).reshape(height, width, channels)[:, :, order]
+        frame = pygame.image.frombuffer(np.ascontiguousarray(rgb).tobytes(), (width, height), "RGB")
+        pygame.image.save(frame, os.path.join(directory, f"frame_{index:06d}.png"))
+
+if __name__ == "__main__":
+    directory, width, height, pix_fmt = sys.argv[1:5]
+    write_png_sequence(directory, int(width), int(height), pix_fmt, sys.stdin.buffer)
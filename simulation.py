@@ -0,0 +1,629 @@
+"""Headless, batched version of the car simulation in main.py.
+
+All (genome, track) pairs are stepped together on numpy arrays, so a whole
+generation can be scored on several maps in one pass without a display.
+The physics mirrors main.CarState.update() and the fitness mirrors eval_genomes().
+"""
+import json
+import math
+import os
+
+import numpy as np
+import pygame
+from neat.graphs import feed_forward_layers
+
+from spatial_grid import GhostPairs, SpatialHashGrid, interact
+
+MAP_DIR = "map"
+SIM_FPS = 60
+RADAR_ANGLES = (-60, -30, 0, 30, 60)
+CONTROL_DELAY = 30 # Frames of full throttle before the network takes over
+
+# --- RACING MODE ---
+CAR_RADIUS = 12 # Map pixels; two cars closer than twice this crash
+
+# --- BEHAVIOUR ---
+# For novelty search a car is described by its final position and where it
+# was every BEHAVIOUR_INTERVAL frames for its first BEHAVIOUR_SAMPLES samples.
+BEHAVIOUR_SAMPLES = 8
+BEHAVIOUR_INTERVAL = 120
+
+def behaviour_descriptor(final, trail, size):
+    """Final (n, 2) and trail (n, BEHAVIOUR_SAMPLES, 2) positions as fractions of the track size (n, 2)."""
+    points = np.concatenate([np.asarray(final, dtype=float)[:, None], np.asarray(trail, dtype=float)], axis=1)
+    return (points / np.asarray(size, dtype=float)[:, None]).reshape(len(points), -1)
+
+# --- TRACKS ---
+def track_scale(width, height, view_width, view_height, zoom):
+    """Same scale load_track_asset() uses to fit a map into the game view."""
+    return min(view_width / width, view_height / height) * zoom
+
+CHANNELS = {"r": 0, "g": 1, "b": 2}
+DEFAULT_UNSAFE_COLOURS = ((2, 105, 31),)
+_lookup_tables = {}
+
+class TrackManifest:
+    """Per-map settings from map/<name>.json, next to the map image.
+
+    Example::
+
+        {
+          "start": {"x": 1427, "y": 1263, "angle": 0},
+          "sensor_range": 300,
+          "unsafe_colours": [[247, 255, 42], [131, 145, 60]],
+          "dominance_rules": [{"channel": "g", "over": ["r", "b"], "margin": 30}]
+        }
+
+    Positions and the sensor range are in original map pixels. A pixel is
+    off-track if it is one of the unsafe colours, or if for any dominance
+    rule its channel exceeds every channel in "over" by more than "margin".
+    Maps without a manifest, and keys a manifest leaves out, use the
+    defaults below.
+    """
+
+    def __init__(self, start=(490, 820), start_angle=0, sensor_range=300,
+                 unsafe_colours=DEFAULT_UNSAFE_COLOURS, dominance_rules=()):
+        self.start = tuple(start)
+        self.start_angle = start_angle
+        self.sensor_range = sensor_range
+        self.unsafe_colours = tuple(tuple(c[:3]) for c in unsafe_colours)
+        self.dominance_rules = tuple((r["channel"], tuple(r["over"]), r["margin"]) for r in dominance_rules)
+
+    @classmethod
+    def for_map(cls, filename):
+        path = os.path.join(MAP_DIR, os.path.splitext(filename)[0] + ".json")
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        start = data.get("start", {})
+        return cls(start=(start.get("x", 490), start.get("y", 820)),
+                   start_angle=start.get("angle", 0),
+                   sensor_range=data.get("sensor_range", 300),
+                   unsafe_colours=data.get("unsafe_colours", DEFAULT_UNSAFE_COLOURS),
+                   dominance_rules=data.get("dominance_rules", ()))
+
+    def lookup_table(self):
+        """Off-track flag for every 24-bit colour, compiled once per rule set."""
+        key = (self.unsafe_colours, self.dominance_rules)
+        lut = _lookup_tables.get(key)
+        if lut is None:
+            lut = np.zeros(1 << 24, dtype=bool)
+            for r, g, b in self.unsafe_colours:
+                lut[(r << 16) | (g << 8) | b] = True
+            # Indexed by (r, g, b), each channel's values run along its own axis
+            cube = lut.reshape(256, 256, 256)
+            values = np.arange(256, dtype=np.int16)
+            channels = [values[:, None, None], values[None, :, None], values[None, None, :]]
+            for channel, over, margin in self.dominance_rules:
+                dominant = channels[CHANNELS[channel]]
+                rule = True
+                for other in over:
+                    rule = rule & (dominant > channels[CHANNELS[other]] + margin)
+                cube |= rule
+            _lookup_tables[key] = lut
+        return lut
+
+    def classify(self, rgb):
+        """Maps an (H, W, 3) pixel array to its boolean off-track mask in one lookup."""
+        packed = rgb[..., 0].astype(np.uint32) << 16
+        packed |= rgb[..., 1].astype(np.uint32) << 8
+        packed |= rgb[..., 2]
+        return self.lookup_table()[packed]
+
+    def classify_surface(self, surface):
+        if surface.get_bytesize() == 4 and surface.get_shifts()[:3] == (16, 8, 0):
+            # Packed XRGB pixels already are LUT indices once the alpha byte is masked off
+            lut = self.lookup_table()
+            return lut[pygame.surfarray.pixels2d(surface).T & 0xFFFFFF]
+        return self.classify(pygame.surfarray.pixels3d(surface).transpose(1, 0, 2))
+
+    def classify_scaled(self, surface, width, height, progress=None):
+        """classify_surface of pygame.transform.scale(surface, (width, height)) without building the scaled copy.
+
+        progress(fraction) is called between bands of rows, for loaders running in the background.
+        """
+        src_width, src_height = surface.get_size()
+        rows = (np.arange(height) * src_height) // height # pygame's nearest-neighbour sampling
+        cols = (np.arange(width) * src_width) // width
+        source = self.classify_surface(surface)
+        if progress is None:
+            return source[rows[:, None], cols]
+        mask = np.empty((height, width), dtype=bool)
+        band = max(1, (1 << 20) // max(1, width))
+        for top in range(0, height, band):
+            mask[top:top + band] = source[rows[top:top + band, None], cols]
+            progress(min(1.0, (top + band) / height))
+        return mask
+
+class Track:
+    """Off-track mask and start pose of one map at simulation scale."""
+
+    def __init__(self, filename, scale):
+        image = pygame.image.load(os.path.join(MAP_DIR, filename))
+        original_width, original_height = image.get_size()
+        width, height = int(original_width * scale), int(original_height * scale)
+        manifest = TrackManifest.for_map(filename)
+
+        self.filename = filename
+        self.scale = scale
+        self.width = width
+        self.height = height
+        self.mask = manifest.classify_scaled(image, width, height)
+        self.start = (manifest.start[0] * (width / original_width), manifest.start[1] * (height / original_height))
+        self.start_angle = manifest.start_angle
+        self.sensor_range = manifest.sensor_range
+
+    @classmethod
+    def fit_to_view(cls, filename, view_width, view_height, zoom):
+        width, height = pygame.image.load(os.path.join(MAP_DIR, filename)).get_size()
+        return cls(filename, track_scale(width, height, view_width, view_height, zoom))
+
+class TrackStack:
+    """Several tracks padded into one (T, H, W) off-track array.
+
+    Pixels outside a track's own width/height are marked off-track, so a single
+    fancy-index lookup serves every track at once.
+    """
+
+    def __init__(self, tracks):
+        self.tracks = list(tracks)
+        max_h = max(t.height for t in self.tracks)
+        max_w = max(t.width for t in self.tracks)
+        self.mask = np.ones((len(self.tracks), max_h, max_w), dtype=bool)
+        for i, t in enumerate(self.tracks):
+            self.mask[i, :t.height, :t.width] = t.mask
+        self.widths = np.array([t.width for t in self.tracks])
+        self.heights = np.array([t.height for t in self.tracks])
+        self.scales = np.array([t.scale for t in self.tracks], dtype=float)
+        self.starts = np.array([t.start for t in self.tracks], dtype=float)
+        self.start_angles = np.array([t.start_angle for t in self.tracks], dtype=float)
+        self.sensor_ranges = np.array([t.sensor_range for t in self.tracks], dtype=float)
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def off_track(self, track_idx, x, y):
+        """Vectorised collision test; x and y must already be integers."""
+        inside = (x >= 0) & (x < self.widths[track_idx]) & (y >= 0) & (y < self.heights[track_idx])
+        hit = np.ones(x.shape, dtype=bool)
+        hit[inside] = self.mask[track_idx[inside], y[inside], x[inside]]
+        return hit
+
+def list_maps():
+    return sorted(f for f in os.listdir(MAP_DIR) if f.endswith(".png"))
+
+# --- BATCHED NETWORKS ---
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(5.0 * z, -60.0, 60.0)))
+
+def _tanh(z):
+    return np.tanh(np.clip(2.5 * z, -60.0, 60.0))
+
+def _relu(z):
+    return np.where(z > 0.0, z, 0.0)
+
+def _identity(z):
+    return z
+
+def _clamped(z):
+    return np.clip(z, -1.0, 1.0)
+
+def _abs(z):
+    return np.abs(z)
+
+NUMPY_ACTIVATIONS = {
+    "sigmoid": _sigmoid,
+    "tanh": _tanh,
+    "relu": _relu,
+    "identity": _identity,
+    "clamped": _clamped,
+    "abs": _abs,
+}
+
+class BatchedNetwork:
+    """Evaluates many feed-forward NEAT genomes as one flat matrix program.
+
+    Every row gets its own copy of its genome's nodes in a single value
+    vector. Nodes are evaluated depth by depth; each depth is one gather of
+    source values, one weighted bincount into the destination nodes and one
+    activation per activation type. Sums are accumulated in connection order,
+    so a row's outputs never depend on which other rows share the batch, or
+    on which of them are evaluated.
+    """
+
+    def __init__(self, genomes, config, rows=None):
+        genome_config = config.genome_config
+        input_keys = genome_config.input_keys
+        output_keys = genome_config.output_keys
+        self.num_inputs = len(input_keys)
+        self.num_outputs = len(output_keys)
+        rows = list(range(len(genomes))) if rows is None else list(rows)
+        self.num_rows = len(rows)
+
+        programs = [self._compile(g, genome_config) for g in genomes]
+        depth_count = max((len(p) for p in programs), default=0)
+        depths = [{"dst": [], "bias": [], "response": [], "act": [], "src": [], "edge_dst": [], "weight": []}
+                  for _ in range(depth_count)]
+
+        # Slot layout: [all inputs (rows x inputs)] then every row's node slots.
+        next_slot = self.num_rows * self.num_inputs
+        output_slots = np.zeros((self.num_rows, self.num_outputs), dtype=np.int64)
+        for r, g_idx in enumerate(rows):
+            slots = {k: r * self.num_inputs + i for i, k in enumerate(input_keys)}
+            for layer in programs[g_idx]:
+                for node, *_ in layer:
+                    slots[node] = next_slot
+                    next_slot += 1
+            for d, layer in enumerate(programs[g_idx]):
+                spec = depths[d]
+                for node, act, bias, response, links in layer:
+                    local = len(spec["dst"])
+                    spec["dst"].append(slots[node])
+                    spec["bias"].append(bias)
+                    spec["response"].append(response)
+                    spec["act"].append(act)
+                    for src, w in links:
+                        spec["src"].append(slots[src])
+                        spec["edge_dst"].append(local)
+                        spec["weight"].append(w)
+            for i, k in enumerate(output_keys):
+                # Outputs that are never evaluated stay at 0.0, as in FeedForwardNetwork.
+                output_slots[r, i] = slots.get(k, -1)
+
+        self.values = np.zeros(next_slot + 1) # Last slot is a constant 0.0
+        self.output_slots = np.where(output_slots < 0, next_slot, output_slots)
+        slot_row = np.empty(next_slot, dtype=np.int64) # Row owning each node slot
+        slot_row[:self.num_rows * self.num_inputs] = np.repeat(np.arange(self.num_rows), self.num_inputs)
+        node_counts = [sum(len(layer) for layer in programs[g_idx]) for g_idx in rows]
+        slot_row[self.num_rows * self.num_inputs:] = np.repeat(np.arange(self.num_rows), node_counts)
+        self.depths = []
+        self.node_rows = [] # Per depth, the row of each node
+        for spec in depths:
+            self.node_rows.append(slot_row[np.array(spec["dst"], dtype=np.int64)])
+            acts = np.array(spec["act"], dtype=object)
+            groups = []
+            for name in sorted(set(spec["act"])):
+                fn = NUMPY_ACTIVATIONS.get(name)
+                if fn is None:
+                    fn = np.vectorize(genome_config.activation_defs.get(name), otypes=[float])
+                groups.append((fn, np.flatnonzero(acts == name)))
+            self.depths.append((
+                np.array(spec["dst"], dtype=np.int64),
+                np.array(spec["bias"], dtype=float),
+                np.array(spec["response"], dtype=float),
+                groups,
+                np.array(spec["src"], dtype=np.int64),
+                np.array(spec["edge_dst"], dtype=np.int64),
+                np.array(spec["weight"], dtype=float),
+            ))
+        self.subset_rows = None
+        self.subset_depths = self.depths
+
+    @staticmethod
+    def _compile(genome, genome_config):
+        """Per-depth node list, matching the order FeedForwardNetwork.create uses."""
+        connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+        layers, required = feed_forward_layers(genome_config.input_keys, genome_config.output_keys, connections)
+        required_with_inputs = required.union(genome_config.input_keys)
+        program = []
+        for layer in layers:
+            nodes = []
+            for node in layer:
+                ng = genome.nodes[node]
+                if ng.aggregation != "sum":
+                    raise ValueError(f"BatchedNetwork only supports sum aggregation, node {node} uses {ng.aggregation!r}")
+                links = [(i, genome.connections[(i, o)].weight) for i, o in connections
+                         if o == node and i in required_with_inputs]
+                nodes.append((node, ng.activation, ng.bias, ng.response, links))
+            program.append(nodes)
+        return program
+
+    def _depths_for(self, rows):
+        """The depth program restricted to the nodes of rows (sorted), cached until rows change."""
+        if self.subset_rows is not None and np.array_equal(self.subset_rows, rows):
+            return self.subset_depths
+        wanted = np.zeros(self.num_rows, dtype=bool)
+        wanted[rows] = True
+        self.subset_depths = []
+        for (dst, bias, response, groups, src, edge_dst, weight), node_row in zip(self.depths, self.node_rows):
+            nodes = wanted[node_row]
+            local = np.cumsum(nodes) - 1
+            edges = nodes[edge_dst]
+            self.subset_depths.append((dst[nodes], bias[nodes], response[nodes],
+                                       [(fn, local[idx[nodes[idx]]]) for fn, idx in groups],
+                                       src[edges], local[edge_dst[edges]], weight[edges]))
+        self.subset_rows = np.array(rows)
+        return self.subset_depths
+
+    def activate(self, inputs, rows=None):
+        """inputs: (len(rows), num_inputs) array for the given rows, all rows by default.
+
+        Returns (len(rows), num_outputs); other rows are not evaluated.
+        """
+        values = self.values
+        if rows is None:
+            depths = self.depths
+            values[:self.num_rows * self.num_inputs] = np.asarray(inputs, dtype=float).ravel()
+        else:
+            depths = self._depths_for(rows)
+            slots = (np.asarray(rows)[:, None] * self.num_inputs + np.arange(self.num_inputs)).ravel()
+            values[slots] = np.asarray(inputs, dtype=float).ravel()
+        for dst, bias, response, groups, src, edge_dst, weight in depths:
+            s = np.bincount(edge_dst, weights=values[src] * weight, minlength=len(dst))
+            z = bias + response * s
+            for fn, idx in groups:
+                z[idx] = fn(z[idx])
+            values[dst] = z
+        return values[self.output_slots if rows is None else self.output_slots[rows]]
+
+# --- BATCHED PHYSICS ---
+def _round_half_away(v):
+    """pygame.Rect rounds float centres half away from zero."""
+    return np.copysign(np.floor(np.abs(v) + 0.5), v)
+
+class BatchSimulation:
+    """Steps every (genome, track) pair of a generation in lockstep."""
+
+    def __init__(self, stack, track_idx, network, zoom, racing=False):
+        self.stack = stack
+        self.track_idx = np.asarray(track_idx, dtype=np.int64)
+        self.network = network
+        n = len(self.track_idx)
+
+        self.scale = stack.scales[self.track_idx]
+        self.reach = stack.sensor_ranges[self.track_idx] * self.scale
+        self.start_x = stack.starts[self.track_idx, 0]
+        self.start_y = stack.starts[self.track_idx, 1]
+        self.x = _round_half_away(self.start_x)
+        self.y = _round_half_away(self.start_y)
+        self.angle = stack.start_angles[self.track_idx].copy()
+        rad = np.radians(-self.angle)
+        self.vel_x = 0.8 * np.cos(rad)
+        self.vel_y = 0.8 * np.sin(rad)
+        self.rotation_vel = 7 * (zoom * 0.8)
+        self.speed = np.full(n, 2.0)
+        self.max_speed = np.full(n, 35 * (zoom * 0.8))
+
+        self.steer = np.zeros(n)
+        self.accel = np.zeros(n)
+        self.brake = np.zeros(n)
+        self.target_steer = np.zeros(n)
+        self.target_accel = np.zeros(n)
+        self.target_brake = np.zeros(n)
+
+        self.alive = np.ones(n, dtype=bool)
+        self.time_alive = np.zeros(n, dtype=np.int64)
+        self.stuck_frames = np.zeros(n, dtype=np.int64)
+        self.distance = np.zeros(n)
+        self.radar_dist = np.zeros((n, len(RADAR_ANGLES)))
+        self.radar_end = np.zeros((n, len(RADAR_ANGLES), 2))
+        self.has_radar = np.zeros(n, dtype=bool) # Inputs read radars from the previous frame
+
+        self.lap_started = np.zeros(n, dtype=bool)
+        self.lap_start = np.zeros(n, dtype=np.int64)
+        self.laps = np.zeros(n, dtype=np.int64)
+        self.last_lap = np.full(n, np.nan)
+        self.best_lap = np.full(n, np.inf)
+        self.fitness = np.zeros(n)
+        self.trail = np.zeros((n, BEHAVIOUR_SAMPLES, 2))
+        self.frame = 0
+
+        self.racing = racing
+        if racing:
+            self.car_radius = CAR_RADIUS * self.scale
+            self.grid = SpatialHashGrid(self.reach.max() + 2 * self.car_radius.max())
+            self.ghosts = GhostPairs() # Cars sharing a start pass through each other until they part
+
+    def inputs(self):
+        data = np.zeros((len(self.alive), len(RADAR_ANGLES) + 1))
+        norm = np.clip(self.radar_dist / self.reach[:, None], 0.0, 1.0)
+        data[:, :len(RADAR_ANGLES)] = np.where(self.has_radar[:, None], 1.0 - norm, 0.0)
+        data[:, -1] = self.speed / self.max_speed
+        return data
+
+    def step(self):
+        self.frame += 1
+        a = np.flatnonzero(self.alive)
+        if not len(a): return
+
+        inputs = self.inputs()[a, :self.network.num_inputs]
+        raw = self.network.activate(inputs, a)
+        driving = self.time_alive[a] >= CONTROL_DELAY
+        steer = raw[:, 1] - raw[:, 0]
+        steer = np.clip(np.where(np.abs(steer) < 0.2, 0.0, steer), -1.0, 1.0)
+        d = a[driving]
+        self.target_steer[d] = steer[driving]
+        self.target_brake[d] = np.clip((raw[driving, 2] + 1) / 2.0, 0.0, 1.0)
+        self.target_accel[d] = np.clip((raw[driving, 3] + 1) / 2.0, 0.0, 1.0)
+
+        # CarState.update()
+        self.time_alive[a] += 1
+        t = self.time_alive[a]
+        launch = a[t < CONTROL_DELAY]
+        self.target_accel[launch] = 1.0
+        self.target_brake[launch] = 0.0
+        self.steer[a] += (self.target_steer[a] - self.steer[a]) * 1.0
+        self.accel[a] += (self.target_accel[a] - self.accel[a]) * 1.0
+        self.brake[a] += (self.target_brake[a] - self.brake[a]) * 1.0
+
+        # drive()
+        speed = self.speed[a]
+        speed += self.accel[a] * np.where(speed > 15, 0.15, 0.5)
+        speed -= self.brake[a] * np.where(speed < 5, 0.05, 0.3)
+        speed *= 0.99
+        speed = np.clip(speed, 0, self.max_speed[a])
+        self.speed[a] = speed
+        last_x, last_y = self.x[a], self.y[a]
+        x = _round_half_away(last_x + self.vel_x[a] * speed)
+        y = _round_half_away(last_y + self.vel_y[a] * speed)
+        self.x[a], self.y[a] = x, y
+        self.distance[a] += speed
+
+        # check_lap()
+        scale = self.scale[a]
+        from_start = np.hypot(x - self.start_x[a], y - self.start_y[a])
+        started = self.lap_started[a]
+        self.lap_start[a[~started & (from_start > 50 * scale)]] = t[~started & (from_start > 50 * scale)]
+        started |= from_start > 50 * scale
+        completed = started & (from_start < 50 * scale)
+        done = a[completed]
+        lap_ms = (self.time_alive[done] - self.lap_start[done]) * 1000.0 / SIM_FPS
+        self.laps[done] += 1
+        self.last_lap[done] = lap_ms
+        self.best_lap[done] = np.minimum(self.best_lap[done], lap_ms)
+        self.max_speed[done] = np.minimum(self.max_speed[done] + 5, 100)
+        started &= ~completed
+        self.lap_started[a] = started
+
+        # rotate()
+        self.angle[a] -= self.rotation_vel * self.steer[a]
+        rad = np.radians(-self.angle[a])
+        self.vel_x[a] = 0.8 * np.cos(rad)
+        self.vel_y[a] = 0.8 * np.sin(rad)
+
+        self._radar(a)
+        alive = ~self._collision(a)
+        if self.racing:
+            radar_dist, radar_end = self.radar_dist[a], self.radar_end[a]
+            alive &= ~interact(self.grid, x, y, self.angle[a], self.track_idx[a], a, self.ghosts,
+                               RADAR_ANGLES, radar_dist, radar_end, self.car_radius[a], self.reach[a])
+            self.radar_dist[a], self.radar_end[a] = radar_dist, radar_end
+
+        alive &= ~((t > 240) & (speed < 0.5))
+        alive &= ~((np.abs(self.steer[a]) > 0.8) & (speed < 3.0) & (t > 120))
+        moved = np.hypot(x - last_x, y - last_y)
+        stuck = np.where(moved < 0.5, self.stuck_frames[a] + 1, 0)
+        self.stuck_frames[a] = stuck
+        alive &= stuck <= 90
+
+        # Fitness, as in eval_genomes()
+        fitness = self.fitness[a]
+        fitness += speed * 0.1
+        fitness += np.where(speed > 5, speed ** 1.5 * 0.05, 0.0)
+        crawling = (t > 100) & (speed < 2)
+        fitness -= np.where(crawling, 2.0, 0.0)
+        alive &= ~crawling
+        self.fitness[a] = fitness
+        self.alive[a] = alive
+
+        sample = self.frame // BEHAVIOUR_INTERVAL - 1
+        if self.frame % BEHAVIOUR_INTERVAL == 0 and sample < BEHAVIOUR_SAMPLES:
+            self.trail[:, sample, 0], self.trail[:, sample, 1] = self.x, self.y
+
+    def _radar(self, a):
+        """Marches all five rays of every alive car at once, one pixel per sample."""
+        cx, cy = self.x[a], self.y[a]
+        reach = self.reach[a]
+        lengths = np.arange(int(math.ceil(reach.max())) + 1)
+        rad = np.radians(self.angle[a][:, None] + np.array(RADAR_ANGLES)[None, :])
+        px = np.trunc(cx[:, None, None] + np.cos(rad)[..., None] * lengths).astype(np.int64)
+        py = np.trunc(cy[:, None, None] - np.sin(rad)[..., None] * lengths).astype(np.int64)
+        track = np.broadcast_to(self.track_idx[a][:, None, None], px.shape)
+        hit = self.stack.off_track(track, px, py)
+        hit &= lengths < reach[:, None, None] # Samples past the sensor range are never tested
+        end = np.where(hit.any(axis=2), hit.argmax(axis=2), np.ceil(reach)[:, None].astype(np.int64))
+        ex = np.take_along_axis(px, end[..., None], axis=2)[..., 0]
+        ey = np.take_along_axis(py, end[..., None], axis=2)[..., 0]
+        self.radar_dist[a] = np.trunc(np.hypot(cx[:, None] - ex, cy[:, None] - ey))
+        self.radar_end[a, :, 0] = ex
+        self.radar_end[a, :, 1] = ey
+        self.has_radar[a] = True
+
+    def _collision(self, a):
+        length = 40 * self.scale[a]
+        cx, cy = self.x[a], self.y[a]
+        crashed = np.zeros(len(a), dtype=bool)
+        for offset in (18, -18):
+            rad = np.radians(self.angle[a] + offset)
+            px = np.trunc(cx + np.cos(rad) * length).astype(np.int64)
+            py = np.trunc(cy - np.sin(rad) * length).astype(np.int64)
+            crashed |= self.stack.off_track(self.track_idx[a], px, py)
+        return crashed
+
+    def behaviour(self):
+        """behaviour_descriptor() of every car; samples not reached yet are the current position."""
+        final = np.stack([self.x, self.y], axis=1)
+        trail = self.trail.copy()
+        trail[:, min(self.frame // BEHAVIOUR_INTERVAL, BEHAVIOUR_SAMPLES):] = final[:, None]
+        size = np.stack([self.stack.widths[self.track_idx], self.stack.heights[self.track_idx]], axis=1)
+        return behaviour_descriptor(final, trail, size)
+
+    def run(self, max_frames, on_frame=None):
+        """Steps until every car is out or max_frames is reached."""
+        while self.frame < max_frames and self.alive.any():
+            self.step()
+            if on_frame is not None and on_frame(self) is False: break
+        return self.fitness
+
+# --- SUCCESSIVE HALVING ---
+def halving_rung(fitness, running, keep):
+    """(promoted, retired) indices: the top keep fraction of the running entries by fitness, and the rest.
+
+    Entries that are not running have finished; they are neither promoted
+    nor retired and do not count towards keep.
+    """
+    entries = np.flatnonzero(running)
+    ranked = entries[np.argsort(-np.asarray(fitness, dtype=float)[entries], kind="stable")]
+    count = max(1, math.ceil(len(ranked) * keep))
+    return ranked[:count], ranked[count:]
+
+class Halving:
+    """Successive halving for evaluate_on_tracks, as main.eval_genomes races its rungs.
+
+    At each frame in rungs, the genomes with a car still running on any track
+    are ranked by mean fitness, and all but the top keep fraction stop. A
+    promoted genome's fitness is floored at the best fitness retired before
+    it. After a run, retired marks the genomes that were stopped early.
+    """
+
+    def __init__(self, rungs, keep):
+        self.rungs = frozenset(rungs)
+        self.keep = keep
+        self.retired = np.zeros(0, dtype=bool)
+        self.floor = np.zeros(0)
+
+    def start(self, count):
+        self.retired = np.zeros(count, dtype=bool)
+        self.floor = np.full(count, -np.inf)
+
+    def step(self, frame, fitness, alive):
+        """fitness per genome; alive is a (genomes, tracks) view of the simulation's flags, cleared for retirees."""
+        if frame not in self.rungs: return
+        promoted, retired = halving_rung(fitness, alive.any(axis=1), self.keep)
+        if not len(retired): return
+        alive[retired] = False
+        self.retired[retired] = True
+        self.floor[promoted] = np.maximum(self.floor[promoted], fitness[retired].max())
+
+    def finish(self, fitness):
+        return np.maximum(fitness, self.floor)
+
+def evaluate_on_tracks(genomes, config, stack, zoom, max_frames, on_frame=None, racing=False, behaviour=False,
+                       halving=None):
+    """Scores every genome on every track of the stack in one batched run.
+
+    Returns one fitness per genome: the mean over tracks. With racing, all
+    genomes share each track and can crash into each other. With halving (a
+    Halving), the genomes race its rungs and only the best keep driving.
+    With behaviour, also returns one row per genome of its behaviour
+    descriptors on every track, first track first.
+    """
+    tracks = len(stack)
+    rows = np.repeat(np.arange(len(genomes)), tracks)
+    track_idx = np.tile(np.arange(tracks), len(genomes))
+    network = BatchedNetwork(genomes, config, rows)
+    sim = BatchSimulation(stack, track_idx, network, zoom, racing)
+    if halving is not None:
+        halving.start(len(genomes))
+        report = on_frame
+        def on_frame(sim):
+            halving.step(sim.frame, sim.fitness.reshape(len(genomes), tracks).mean(axis=1),
+                         sim.alive.reshape(len(genomes), tracks))
+            return None if report is None else report(sim)
+    fitness = sim.run(max_frames, on_frame).reshape(len(genomes), tracks).mean(axis=1)
+    if halving is not None:
+        fitness = halving.finish(fitness)
+    if behaviour:
+        return fitness, sim.behaviour().reshape(len(genomes), tracks * 2 * (BEHAVIOUR_SAMPLES + 1))
+    return fitness
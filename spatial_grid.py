@@ -0,0 +1,143 @@
+"""Uniform spatial hash grid for car-to-car interaction.
+
+The grid is rebuilt from scratch every step: cars are bucketed by cell with
+one sort, and neighbour pairs come from searching the 3x3 block of cells
+around each car. With cells at least as large as the query radius, the
+work grows with the number of nearby pairs instead of with n².
+
+Every car leaves the same start pose, so the field begins as one heap.
+GhostPairs lets the cars of each pair that starts out overlapping pass
+through each other until that pair has first pulled apart.
+"""
+import numpy as np
+
+_CELL_BITS = 21
+_CELL_OFFSET = 1 << (_CELL_BITS - 1)
+# Half of the 3x3 neighbourhood, so every pair of cells is visited once.
+_FORWARD_CELLS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+class SpatialHashGrid:
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.order = np.zeros(0, dtype=np.int64)
+        self.sorted_keys = np.zeros(0, dtype=np.int64)
+
+    def _keys(self, cx, cy, group):
+        return ((((group << _CELL_BITS) + (cx + _CELL_OFFSET)) << _CELL_BITS) + (cy + _CELL_OFFSET))
+
+    def rebuild(self, x, y, group=None):
+        """Buckets points by cell. Points in different groups (e.g. tracks) never meet."""
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.group = np.zeros(len(self.x), dtype=np.int64) if group is None else np.asarray(group, dtype=np.int64)
+        self.cx = np.floor(self.x / self.cell_size).astype(np.int64)
+        self.cy = np.floor(self.y / self.cell_size).astype(np.int64)
+        keys = self._keys(self.cx, self.cy, self.group)
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    def pairs(self, radius):
+        """All index pairs (i, j), i != j, at most radius apart, each reported once.
+
+        radius must not exceed the cell size.
+        """
+        if radius > self.cell_size:
+            raise ValueError(f"Query radius {radius} is larger than the cell size {self.cell_size}")
+        n = len(self.order)
+        first, second = [], []
+        sorted_pos = np.arange(n)
+        cx, cy, group = self.cx[self.order], self.cy[self.order], self.group[self.order]
+        for dx, dy in _FORWARD_CELLS:
+            target = self._keys(cx + dx, cy + dy, group)
+            hi = np.searchsorted(self.sorted_keys, target, side="right")
+            if dx == 0 and dy == 0:
+                lo = sorted_pos + 1 # Same cell: only the cars sorted after this one
+            else:
+                lo = np.searchsorted(self.sorted_keys, target, side="left")
+            counts = np.maximum(hi - lo, 0)
+            total = counts.sum()
+            if not total: continue
+            src = np.repeat(sorted_pos, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            first.append(src)
+            second.append(np.repeat(lo, counts) + offsets)
+
+        if not first:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        i = self.order[np.concatenate(first)]
+        j = self.order[np.concatenate(second)]
+        close = np.hypot(self.x[i] - self.x[j], self.y[i] - self.y[j]) <= radius
+        return i[close], j[close]
+
+class GhostPairs:
+    """Pairs of cars that have overlapped since the start and not yet separated.
+
+    The first update() records every touching pair. A pair drops out, for
+    good, at the first step its cars no longer touch. Create one per race.
+    """
+
+    def __init__(self):
+        self.keys = None # Sorted pair keys
+
+    def update(self, a, b, touching):
+        """Mask of the pairs of car ids (a, b), each given once, that are still ghosts."""
+        keys = (np.minimum(a, b) << 32) | np.maximum(a, b)
+        if self.keys is not None:
+            pos = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+            touching = touching & (self.keys[pos] == keys) if len(self.keys) else np.zeros_like(touching)
+        self.keys = np.sort(keys[touching])
+        return touching
+
+def interact(grid, x, y, angle, group, ids, ghosts, radar_angles, radar_dist, radar_end, car_radius, reach):
+    """Car-to-car collisions and radar hits for one step.
+
+    x, y, angle, group and ids (stable, unique, below 2**31) describe the
+    cars on track; car_radius and reach may be per-car arrays. The cars of a
+    pair in ghosts (a GhostPairs) neither hit nor see each other. radar_dist
+    (n, rays) and radar_end (n, rays, 2) are shortened in place where a ray
+    meets another car first. Returns a boolean array of the cars that
+    crashed into each other.
+    """
+    n = len(x)
+    crashed = np.zeros(n, dtype=bool)
+    if n < 2: return crashed
+    car_radius = np.broadcast_to(np.asarray(car_radius, dtype=float), (n,))
+    reach = np.broadcast_to(np.asarray(reach, dtype=float), (n,))
+
+    grid.rebuild(x, y, group)
+    i, j = grid.pairs(min(grid.cell_size, float(reach.max() + car_radius.max())))
+    dist = np.hypot(x[i] - x[j], y[i] - y[j])
+    hit = dist < car_radius[i] + car_radius[j]
+    ids = np.asarray(ids, dtype=np.int64)
+    solid = ~ghosts.update(ids[i], ids[j], hit)
+    i, j, hit = i[solid], j[solid], hit[solid]
+    if not len(i): return crashed
+
+    crashed[i[hit]] = True
+    crashed[j[hit]] = True
+
+    # Each pair is seen from both sides.
+    viewer = np.concatenate([i, j])
+    target = np.concatenate([j, i])
+    dx = (x[target] - x[viewer])[:, None]
+    dy = (y[target] - y[viewer])[:, None]
+    rad = np.radians(angle[viewer][:, None] + np.asarray(radar_angles)[None, :])
+    ux, uy = np.cos(rad), -np.sin(rad)
+    along = dx * ux + dy * uy
+    perp_sq = (dx * dx + dy * dy) - along * along
+    r_sq = (car_radius[target] ** 2)[:, None]
+    seen = (along > 0) & (perp_sq < r_sq)
+    hit_dist = np.where(seen, along - np.sqrt(np.maximum(r_sq - perp_sq, 0.0)), np.inf)
+    hit_dist = np.maximum(hit_dist, 0.0)
+
+    nearest = np.full((n, len(radar_angles)), np.inf)
+    np.minimum.at(nearest, viewer, hit_dist)
+    closer = nearest < radar_dist
+    if closer.any():
+        car_idx, ray_idx = np.nonzero(closer)
+        d = np.trunc(nearest[car_idx, ray_idx])
+        rad = np.radians(angle[car_idx] + np.asarray(radar_angles)[ray_idx])
+        radar_dist[car_idx, ray_idx] = d
+        radar_end[car_idx, ray_idx, 0] = np.trunc(x[car_idx] + np.cos(rad) * d)
+        radar_end[car_idx, ray_idx, 1] = np.trunc(y[car_idx] - np.sin(rad) * d)
+    return crashed
@@ -0,0 +1,106 @@
+"""Track rendering from lazily built, mip-mapped tiles.
+
+The map image stays at its original size. Square tiles are cut from it at mip
+level 0 (full resolution), 1 (half), 2 (quarter)... only when they come into
+view, and scaled to the current on-screen size. Both kinds of tile share one
+LRU cache with a byte budget sized from the viewport. Memory therefore does
+not grow with the map or its scale, and a zoom change only rescales the
+tiles in view.
+
+Screen tiles are cached by their exact size, so a zoom that changes every
+frame would rebuild every tile every frame and flush the cache. A view
+whose zoom is animating draws at snap_zoom() of it instead, ZOOM_STEPS
+fixed levels per doubling, and each level's tiles are built once.
+"""
+import math
+from collections import OrderedDict
+
+import pygame
+
+TILE_SIZE = 256
+ZOOM_STEPS = 16 # Levels per doubling that an animating zoom snaps to
+
+def snap_zoom(zoom):
+    """Nearest of the ZOOM_STEPS levels per doubling to zoom."""
+    return 2 ** (round(math.log2(zoom) * ZOOM_STEPS) / ZOOM_STEPS)
+
+def _surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+class TiledTrack:
+    """Draws a map whose pixels are scale world pixels wide, at any view zoom."""
+
+    def __init__(self, source, scale, viewport, tile_size=TILE_SIZE, cache_viewports=4):
+        self.source = source # 24/32-bit, as smoothscale requires
+        self.scale = scale
+        self.tile_size = tile_size
+        self.width, self.height = source.get_size()
+        self.levels = max(1, math.ceil(math.log2(max(self.width, self.height) / tile_size)) + 1)
+        self.budget = viewport[0] * viewport[1] * source.get_bytesize() * cache_viewports
+
+        self.tiles = OrderedDict()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._touched = 0
+
+    def level_for(self, zoom):
+        """Coarsest mip level that still has at least one texel per screen pixel."""
+        texels = 1.0 / (self.scale * zoom) # Source pixels per screen pixel
+        if texels < 2: return 0
+        return min(self.levels - 1, int(math.log2(texels)))
+
+    def _cached(self, key, build):
+        self._touched += 1
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+        self.misses += 1
+        tile = self.tiles[key] = build()
+        self.cached_bytes += _surface_bytes(tile)
+        return tile
+
+    def _evict(self, keep):
+        """Drops least recently used tiles over budget, never the keep most recent ones."""
+        while self.cached_bytes > self.budget and len(self.tiles) > keep:
+            _, tile = self.tiles.popitem(last=False)
+            self.cached_bytes -= _surface_bytes(tile)
+
+    def _source_area(self, level, tx, ty):
+        span = self.tile_size << level
+        x, y = tx * span, ty * span
+        return pygame.Rect(x, y, min(span, self.width - x), min(span, self.height - y))
+
+    def level_tile(self, level, tx, ty):
+        area = self._source_area(level, tx, ty)
+        if level == 0:
+            return self.source.subsurface(area) # Shares the source pixels, nothing to cache
+        size = (max(1, -(-area.width >> level)), max(1, -(-area.height >> level)))
+        return self._cached(("level", level, tx, ty),
+                            lambda: pygame.transform.smoothscale(self.source.subsurface(area), size))
+
+    def draw(self, target, origin, zoom, area=None):
+        """Draws the track so world point p lands on origin + p * zoom, limited to area (default: the clip)."""
+        area = target.get_clip() if area is None else pygame.Rect(area)
+        self._touched = 0
+        level = self.level_for(zoom)
+        span = self.tile_size << level
+        step = span * self.scale * zoom # Screen pixels per tile
+        ox, oy = origin
+        cols = -(-self.width // span)
+        rows = -(-self.height // span)
+        tx0, tx1 = max(0, math.floor((area.left - ox) / step)), min(cols - 1, math.floor((area.right - ox) / step))
+        ty0, ty1 = max(0, math.floor((area.top - oy) / step)), min(rows - 1, math.floor((area.bottom - oy) / step))
+
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                src = self._source_area(level, tx, ty)
+                # One pixel of overlap hides seams from rounding; none past the map's own edge
+                size = (math.ceil(src.width * self.scale * zoom) + (tx < cols - 1),
+                        math.ceil(src.height * self.scale * zoom) + (ty < rows - 1))
+                tile = self._cached(("screen", level, tx, ty, size),
+                                    lambda: pygame.transform.scale(self.level_tile(level, tx, ty), size))
+                target.blit(tile, (math.floor(ox + tx * step), math.floor(oy + ty * step)))
+        self._evict(self._touched)
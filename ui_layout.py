@@ -0,0 +1,16 @@
+"""Window layout and display formatting shared by main.py and the headless tools.
+
+champion.py and distributed.py scale tracks for a given screen size exactly
+as the game window does, so they take the game view's width from here.
+"""
+UI_PERCENTAGE = 0.25 # Share of the window taken by the side panel; the rest is the game view
+
+def game_view_width(screen_width):
+    """Width of the game view in a window screen_width pixels wide."""
+    return screen_width - int(screen_width * UI_PERCENTAGE)
+
+def format_time(ms):
+    minutes = int(ms // 60000)
+    seconds = int((ms % 60000) // 1000)
+    milliseconds = int(ms % 1000)
+    return f"{minutes}:{seconds:02}.{milliseconds:03}"